@@ -23,6 +23,9 @@ import constants
 
 home = str(Path.home())
 
+# Seconds the player may take to wrap up after the game is over
+GAME_OVER_GRACE = 1.0
+
 
 class Fishes(SettingLoader):
     def __init__(self):
@@ -102,7 +105,16 @@ class FishingDerbyApp(App, SettingLoader, Communicator):
         self.frames_per_action = 10
 
     def on_stop(self):
-        os.kill(self.player_loop.pid, 9)
+        self.stop_player_loop()
+
+    def stop_player_loop(self, grace=0):
+        """
+        Kill the player process, after waiting up to grace seconds for it to exit.
+        """
+        if grace > 0:
+            self.player_loop.join(grace)
+        if self.player_loop.is_alive():
+            os.kill(self.player_loop.pid, 9)
 
     # Steps counter is a number that goes from 0 to 10
     @property
@@ -185,7 +197,7 @@ class FishingDerbyApp(App, SettingLoader, Communicator):
             self.update_scheduled.cancel()
             self.display_stats()
             self.sender(msg)
-            os.kill(self.player_loop.pid, 9)
+            self.stop_player_loop(GAME_OVER_GRACE)
             return False
 
         self.update_specific(msg)
@@ -338,7 +350,7 @@ class FishingDerbyHMMApp(FishingDerbyApp, Fishes, PrintScore1Player):
             self.main_widget.game_over = True
 
         if self.main_widget.game_over:
-            os.kill(self.player_loop.pid, 9)
+            self.stop_player_loop()
         else:
             msg_reveal = self.evaluate_guess(msg)
             if msg_reveal["reveal"]:
@@ -373,9 +385,12 @@ class FishingDerbyHMMApp(FishingDerbyApp, Fishes, PrintScore1Player):
         return msg_reveal
 
     def update_specific(self, msg):
-        for k in self.fishes.keys():
-            msg[k] = self.fishes[k].observation
-        self.sender(msg)
+        if self.binary_protocol:
+            self.send_observations([fish.observation for fish in self.fishes.values()])
+        else:
+            for k in self.fishes.keys():
+                msg[k] = self.fishes[k].observation
+            self.sender(msg)
         self.initial_time = time()
 
     def update(self, dt):
@@ -1,18 +1,9 @@
 import math
 
+from matrix_io import parse_matrix
+
 def f_create_matrix(p_matrix_item):
-    #l_matrix_list   = list(p_matrix_item.split())
-    l_matrix_elem   = list(map(float, p_matrix_item[2:]))
-    l_rows          = int(p_matrix_item[0])
-    l_cols          = int(p_matrix_item[1])
-    l_matrix        = []
-    for i_row in range(l_rows):
-        t_row_list = []
-        for i_col in range(l_cols):
-            if l_matrix_elem[i_col] not in l_matrix:
-                t_row_list.append(l_matrix_elem[l_cols * i_row + i_col])
-        l_matrix.append(t_row_list)
-    return l_matrix
+    return parse_matrix(p_matrix_item).tolist()
 
 
 def f_alpha_pass(p_trans_matrix_A, p_obs_matrix_B, p_init_prob_pi, p_obs_seq, p_N, p_T):
@@ -0,0 +1,326 @@
+import sys
+
+import numpy as np
+
+epsilon = sys.float_info.epsilon
+
+
+# ndarray-native kernels. A is N x N, B is N x M, pi is a flat vector of size N
+# and obs is a 1-D integer array of length T.
+
+def alpha_pass(A, B, pi, obs):
+    """
+    Scaled forward pass, one matrix-vector product per time step.
+    :param A: transition matrix (N x N)
+    :param B: emission matrix (N x M)
+    :param pi: initial state distribution (N)
+    :param obs: observation sequence (T)
+    :return: scaled alphas (T x N) and the reciprocal scaling factors c (T)
+    """
+    T = len(obs)
+    b_obs = B[:, obs].T
+    alpha = np.empty((T, A.shape[0]), dtype=A.dtype)
+    c = np.empty(T, dtype=A.dtype)
+
+    t_alpha = pi * b_obs[0]
+    for t in range(T):
+        if t > 0:
+            t_alpha = (alpha[t - 1] @ A) * b_obs[t]
+        # c[t] is the reciprocal of the sum of the alphas at time t
+        c[t] = 1 / (t_alpha.sum() + epsilon)
+        alpha[t] = c[t] * t_alpha
+
+    return alpha, c
+
+
+def beta_pass(A, B, obs, c):
+    """
+    Scaled backward pass using the scaling factors of the alpha pass.
+    :return: scaled betas (T x N), in natural time order
+    """
+    T = len(obs)
+    b_obs = B[:, obs].T
+    beta = np.empty((T, A.shape[0]), dtype=A.dtype)
+
+    beta[T - 1] = c[T - 1]
+    for t in range(T - 2, -1, -1):
+        beta[t] = c[t] * (A @ (b_obs[t + 1] * beta[t + 1]))
+
+    return beta
+
+
+def comp_gamma(A, B, obs, alpha, beta):
+    """
+    Di-gammas and gammas computed with broadcasting over the whole sequence.
+    :return: gammas (T x N) and di-gammas ((T-1) x N x N)
+    """
+    b_beta = B[:, obs[1:]].T * beta[1:]
+    gamma_ij = alpha[:-1, :, None] * A[None, :, :] * b_beta[:, None, :]
+
+    gamma = np.empty_like(alpha)
+    gamma[:-1] = gamma_ij.sum(axis=2)
+    gamma[-1] = alpha[-1]
+    return gamma, gamma_ij
+
+
+def re_estimate(gamma, gamma_ij, obs, M):
+    """
+    Re-estimate the model from the gammas and di-gammas.
+    :return: pi (N), A (N x N), B (N x M)
+    """
+    pi = gamma[0].copy()
+
+    A = gamma_ij.sum(axis=0) / (gamma[:-1].sum(axis=0)[:, None] + epsilon)
+
+    one_hot = (obs[:, None] == np.arange(M)).astype(gamma.dtype)
+    B = (gamma.T @ one_hot) / (gamma.sum(axis=0)[:, None] + epsilon)
+
+    return pi, A, B
+
+
+def prob_log(c):
+    # Accumulated in double precision whatever the precision of c
+    return -np.log(c).sum(dtype=np.float64)
+
+
+def em_step(A, B, pi, obs, M):
+    """
+    One Baum-Welch iteration.
+    :return: re-estimated A, B, pi and the log probability of obs under the old model
+    """
+    alpha, c = alpha_pass(A, B, pi, obs)
+    beta = beta_pass(A, B, obs, c)
+    gamma, gamma_ij = comp_gamma(A, B, obs, alpha, beta)
+    pi, A, B = re_estimate(gamma, gamma_ij, obs, M)
+    return A, B, pi, prob_log(c)
+
+
+def em_step_streaming(A, B, pi, obs, M, chunk=None):
+    """
+    One Baum-Welch iteration that accumulates the expected counts during the
+    backward sweep instead of building the gammas and di-gammas. The forward
+    sweep only keeps the alpha at the start of every chunk of steps, and the
+    alphas of a chunk are recomputed from it when the backward sweep gets
+    there, so the workspace is O(T/chunk * N + chunk * N + N^2): O(sqrt(T) N)
+    with the default chunk, one T x N array with chunk=T.
+    :param chunk: steps between checkpoints, defaults to sqrt(T)
+    :return: re-estimated A, B, pi and the log probability of obs under the old model
+    """
+    T, N = len(obs), A.shape[0]
+    if chunk is None:
+        chunk = int(np.sqrt(T))
+    chunk = min(max(chunk, 1), T)
+    B_T = np.ascontiguousarray(B.T)
+
+    def forward(alpha, c, start, stop):
+        # Fills alpha[1:] and c[1:] for the steps start+1 .. stop-1 from alpha[0]
+        for i in range(1, stop - start):
+            t_alpha = (alpha[i - 1] @ A) * B_T[obs[start + i]]
+            c[i] = 1 / (t_alpha.sum() + epsilon)
+            alpha[i] = c[i] * t_alpha
+
+    # Forward sweep, keeping the alpha and c at the start of every chunk
+    n_chunks = -(-T // chunk)
+    check_alpha = np.empty((n_chunks, N), dtype=A.dtype)
+    check_c = np.empty(n_chunks, dtype=A.dtype)
+    alpha = np.empty((chunk, N), dtype=A.dtype)
+    c = np.empty(chunk, dtype=A.dtype)
+    log_prob = 0.0
+    for k in range(n_chunks):
+        start, stop = k * chunk, min((k + 1) * chunk, T)
+        if k == 0:
+            t_alpha = pi * B_T[obs[0]]
+        else:
+            t_alpha = (alpha[chunk - 1] @ A) * B_T[obs[start]]
+        c[0] = 1 / (t_alpha.sum() + epsilon)
+        alpha[0] = c[0] * t_alpha
+        forward(alpha, c, start, stop)
+        check_alpha[k], check_c[k] = alpha[0], c[0]
+        log_prob -= np.log(c[:stop - start]).sum(dtype=np.float64)
+
+    # Backward sweep, one chunk at a time from the end
+    gamma_ij_sum = np.zeros((N, N), dtype=A.dtype)
+    gamma_from = np.zeros(N, dtype=A.dtype)
+    counts = np.zeros((M, N), dtype=A.dtype)
+    beta = np.empty((chunk + 1, N), dtype=A.dtype)
+    for k in range(n_chunks - 1, -1, -1):
+        start, stop = k * chunk, min((k + 1) * chunk, T)
+        n = stop - start
+        alpha[0], c[0] = check_alpha[k], check_c[k]
+        forward(alpha, c, start, stop)
+
+        # beta[n] holds the beta of the first step of the next chunk
+        if stop == T:
+            beta[n - 1] = c[n - 1]
+            last = n - 1
+        else:
+            last = n
+        for i in range(last - 1, -1, -1):
+            beta[i] = c[i] * (A @ (B_T[obs[start + i + 1]] * beta[i + 1]))
+
+        gamma = alpha[:n] * beta[:n] / c[:n, None]
+        np.add.at(counts, obs[start:stop], gamma)
+        # Pairs (t, t+1) starting in this chunk
+        b_beta_to = B_T[obs[start + 1:start + last + 1]] * beta[1:last + 1]
+        gamma_ij_sum += alpha[:last].T @ b_beta_to
+        gamma_from += gamma[:last].sum(axis=0)
+
+        beta[chunk] = beta[0]
+
+    pi = gamma[0].copy()
+    A = A * gamma_ij_sum / (gamma_from[:, None] + epsilon)
+    B = counts.T / (counts.sum(axis=0)[:, None] + epsilon)
+    return A, B, pi, log_prob
+
+
+# Drop-in replacements for the list based functions in baum_welch_functions.py.
+# They take and return the same (nested list) arguments.
+
+def f_alpha_pass(p_trans_matrix_A, p_obs_matrix_B, p_init_prob_pi, p_obs_seq, p_N, p_T):
+    l_alpha, l_c = alpha_pass(np.asarray(p_trans_matrix_A, dtype=float),
+                              np.asarray(p_obs_matrix_B, dtype=float),
+                              np.asarray(p_init_prob_pi[0], dtype=float),
+                              np.asarray(p_obs_seq[:p_T], dtype=np.intp))
+    return l_alpha.tolist(), l_c.tolist()
+
+
+def f_beta_pass(a, b, p, seq, c, N, T):
+    # seq and c are given reversed and the betas are returned reversed as well
+    l_beta = beta_pass(np.asarray(a, dtype=float),
+                       np.asarray(b, dtype=float),
+                       np.asarray(seq[:T][::-1], dtype=np.intp),
+                       np.asarray(c[:T][::-1], dtype=float))
+    return l_beta[::-1].tolist()
+
+
+def f_comp_gamma(a, b, seq, alpha_list, beta_list, N, T):
+    l_gamma, l_gamma_ij = comp_gamma(np.asarray(a, dtype=float),
+                                     np.asarray(b, dtype=float),
+                                     np.asarray(seq[:T], dtype=np.intp),
+                                     np.asarray(alpha_list, dtype=float),
+                                     np.asarray(beta_list, dtype=float))
+    return l_gamma.tolist(), l_gamma_ij.tolist()
+
+
+def f_re_estimate(gama_list, gama_ij_list, seq, M, N, T):
+    l_pi, l_A, l_B = re_estimate(np.asarray(gama_list, dtype=float),
+                                 np.asarray(gama_ij_list, dtype=float),
+                                 np.asarray(seq[:T], dtype=np.intp), M)
+    return [l_pi.tolist()], l_A.tolist(), l_B.tolist()
+
+
+def f_prob_log(c, T):
+    return float(prob_log(np.asarray(c[:T], dtype=float)))
+
+
+# Batched kernels for training one model on several sequences at once. The
+# sequences are stacked into a padded S x T array and lengths holds the number
+# of valid steps of each row.
+
+def pad_sequences(sequences, dtype=np.intp):
+    """
+    Stack ragged observation sequences into a zero padded array.
+    :param sequences: iterable of observation sequences
+    :return: padded observations (S x T) and the length of every sequence (S)
+    """
+    sequences = [np.asarray(seq, dtype=dtype) for seq in sequences]
+    lengths = np.array([len(seq) for seq in sequences], dtype=np.intp)
+    obs = np.zeros((len(sequences), lengths.max(initial=0)), dtype=dtype)
+    for s, seq in enumerate(sequences):
+        obs[s, :len(seq)] = seq
+    return obs, lengths
+
+
+def alpha_pass_batch(A, B, pi, obs, mask):
+    """
+    Scaled forward pass over a batch of padded sequences. A, B and pi may have
+    leading dimensions (e.g. K x N x N) to run several models at once.
+    :param mask: boolean S x T array, True on the valid steps
+    :return: scaled alphas (... x S x T x N) and scaling factors c (... x S x T), with c = 1 on padding
+    """
+    S, T = obs.shape
+    b_obs = np.swapaxes(B, -1, -2)[..., obs, :]
+    alpha = np.empty(A.shape[:-2] + (S, T, A.shape[-1]), dtype=A.dtype)
+    c = np.empty(A.shape[:-2] + (S, T), dtype=A.dtype)
+
+    t_alpha = pi[..., None, :] * b_obs[..., 0, :]
+    for t in range(T):
+        if t > 0:
+            t_alpha = (alpha[..., t - 1, :] @ A) * b_obs[..., t, :]
+        c[..., t] = np.where(mask[:, t], 1 / (t_alpha.sum(axis=-1) + epsilon), 1)
+        alpha[..., t, :] = c[..., t, None] * t_alpha
+
+    return alpha, c
+
+
+def beta_pass_batch(A, B, obs, c, lengths):
+    """
+    Scaled backward pass over a batch of padded sequences. Every sequence
+    starts from its own last valid step and the padding is left at zero.
+    :return: scaled betas (... x S x T x N)
+    """
+    S, T = obs.shape
+    b_obs = np.swapaxes(B, -1, -2)[..., obs, :]
+    A_T = np.swapaxes(A, -1, -2)
+    beta = np.zeros(A.shape[:-2] + (S, T, A.shape[-1]), dtype=A.dtype)
+
+    for t in range(T - 1, -1, -1):
+        t_beta = np.where((t == lengths - 1)[:, None], c[..., t, None], 0)
+        if t < T - 1:
+            t_beta = t_beta + c[..., t, None] * ((b_obs[..., t + 1, :] * beta[..., t + 1, :]) @ A_T)
+        beta[..., t, :] = t_beta
+
+    return beta
+
+
+def re_estimate_batch(A, B, obs, mask, alpha, beta, c, M):
+    """
+    Re-estimate the model from the expected counts accumulated over every
+    sequence. The di-gammas are summed directly into an N x N matrix, so the
+    S x T x N x N tensor is never built.
+    :return: pi (... x N), A (... x N x N), B (... x N x M)
+    """
+    lead, N = A.shape[:-2], A.shape[-1]
+    gamma = alpha * beta / c[..., None]
+    gamma[..., ~mask, :] = 0
+
+    # alpha_t(i) * a_ij * b_j(o_t+1) * beta_t+1(j), summed over all valid (t, t+1) pairs
+    pair_mask = mask[:, 1:, None]
+    alpha_from = (alpha[..., :-1, :] * pair_mask).reshape(lead + (-1, N))
+    b_beta_to = (np.swapaxes(B, -1, -2)[..., obs[:, 1:], :] * beta[..., 1:, :]).reshape(lead + (-1, N))
+    gamma_ij_sum = A * (np.swapaxes(alpha_from, -1, -2) @ b_beta_to)
+    gamma_from = (gamma[..., :-1, :] * pair_mask).reshape(lead + (-1, N)).sum(axis=-2)
+
+    pi = gamma[..., 0, :].sum(axis=-2) / len(obs)
+
+    # The epsilon pseudo-counts keep every probability positive, otherwise a
+    # symbol unseen in one sequence zeroes the alphas of another one
+    A = (gamma_ij_sum + epsilon) / (gamma_from[..., None] + N * epsilon)
+
+    gamma_flat = gamma.reshape(lead + (-1, N))
+    counts = np.zeros(lead + (M, N), dtype=gamma.dtype)
+    for model in np.ndindex(*lead):
+        np.add.at(counts[model], obs.ravel(), gamma_flat[model])
+    B = (np.swapaxes(counts, -1, -2) + epsilon) / (gamma_flat.sum(axis=-2)[..., None] + M * epsilon)
+
+    return pi, A, B
+
+
+def prob_log_batch(c):
+    """
+    :return: total log probability of the batch, per model if there are leading dimensions
+    """
+    return -np.log(c).sum(axis=(-2, -1), dtype=np.float64)
+
+
+def em_step_batch(A, B, pi, obs, lengths, M, mask=None):
+    """
+    One Baum-Welch iteration over a batch of padded sequences.
+    :return: re-estimated A, B, pi and the total log probability of obs under the old model
+    """
+    if mask is None:
+        mask = np.arange(obs.shape[1]) < lengths[:, None]
+    alpha, c = alpha_pass_batch(A, B, pi, obs, mask)
+    beta = beta_pass_batch(A, B, obs, c, lengths)
+    pi, A, B = re_estimate_batch(A, B, obs, mask, alpha, beta, c, M)
+    return A, B, pi, prob_log_batch(c)
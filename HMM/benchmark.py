@@ -0,0 +1,230 @@
+import argparse
+import functools
+from argparse import Namespace
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+import baum_welch_functions as bwf
+import baum_welch_numpy as bwn
+from forward import forward
+from player import forward_algorithm
+from viterbi import viterbi
+
+KERNELS = ("forward", "backward", "gamma", "re_estimate", "em", "em_streaming", "viterbi", "score")
+
+GRIDS = {
+    "quick": {"N": (1, 4, 16), "M": (8,), "T": (50, 1000)},
+    "full": {"N": (1, 2, 4, 8, 16, 32, 64), "M": (8, 32, 256), "T": (50, 1000, 10000, 100000)},
+}
+
+# Cases above these sizes are skipped
+MAX_WORKSPACE_BYTES = 512 * 2 ** 20
+MAX_LIST_OPERATIONS = 2 * 10 ** 6
+
+
+def list_kernels(A, B, pi, obs, kernels):
+    """
+    The list based functions of baum_welch_functions, called the way baum_welch.py
+    did, and the player's forward_algorithm.
+    :return: dictionary from kernel name to a callable running it
+    """
+    A, B, pi, obs = A.tolist(), B.tolist(), [pi.tolist()], obs.tolist()
+    N, M, T = len(A), len(B[0]), len(obs)
+    model = Namespace(A=A, B=B, PI=pi)
+    alpha, c = bwf.f_alpha_pass(A, B, pi, obs, N, T)
+
+    def backward():
+        return bwf.f_beta_pass(A, B, pi, obs[::-1], c[::-1], N, T)[::-1]
+
+    def em():
+        l_alpha, l_c = bwf.f_alpha_pass(A, B, pi, obs, N, T)
+        l_beta = bwf.f_beta_pass(A, B, pi, obs[::-1], l_c[::-1], N, T)[::-1]
+        l_gamma, l_gamma_ij = bwf.f_comp_gamma(A, B, obs, l_alpha, l_beta, N, T)
+        return bwf.f_re_estimate(l_gamma, l_gamma_ij, obs, M, N, T), bwf.f_prob_log(l_c, T)
+
+    runs = {
+        "forward": lambda: bwf.f_alpha_pass(A, B, pi, obs, N, T),
+        "backward": backward,
+        "em": em,
+        "score": lambda: forward_algorithm(obs, model),
+    }
+    if "gamma" in kernels or "re_estimate" in kernels:
+        beta = backward()
+        runs["gamma"] = lambda: bwf.f_comp_gamma(A, B, obs, alpha, beta, N, T)
+        gamma, gamma_ij = runs["gamma"]()
+        runs["re_estimate"] = lambda: bwf.f_re_estimate(gamma, gamma_ij, obs, M, N, T)
+    return runs
+
+
+def numpy_kernels(A, B, pi, obs, kernels, dtype=np.float64):
+    """
+    The ndarray kernels of baum_welch_numpy, viterbi and forward.
+    :param dtype: precision of the model and of the workspaces
+    :return: dictionary from kernel name to a callable running it
+    """
+    A, B, pi = A.astype(dtype), B.astype(dtype), pi.astype(dtype)
+    M = B.shape[1]
+    alpha, c = bwn.alpha_pass(A, B, pi, obs)
+
+    runs = {
+        "forward": lambda: bwn.alpha_pass(A, B, pi, obs),
+        "backward": lambda: bwn.beta_pass(A, B, obs, c),
+        "em": lambda: bwn.em_step(A, B, pi, obs, M),
+        "em_streaming": lambda: bwn.em_step_streaming(A, B, pi, obs, M),
+        "viterbi": lambda: viterbi(A, B, pi, obs),
+        "score": lambda: forward(A, B, pi, obs, scaled=True),
+    }
+    if "gamma" in kernels or "re_estimate" in kernels:
+        beta = bwn.beta_pass(A, B, obs, c)
+        runs["gamma"] = lambda: bwn.comp_gamma(A, B, obs, alpha, beta)
+        gamma, gamma_ij = runs["gamma"]()
+        runs["re_estimate"] = lambda: bwn.re_estimate(gamma, gamma_ij, obs, M)
+    return runs
+
+
+# Engines compared by the benchmark, each a function building the kernels of a case
+ENGINES = {
+    "list": list_kernels,
+    "numpy": numpy_kernels,
+    "numpy32": functools.partial(numpy_kernels, dtype=np.float32),
+}
+
+
+def skip_reason(engine, kernel, N, M, T):
+    """
+    Rough cost of a case, to skip the ones that would not fit in memory (the
+    T x N x N di-gammas) or take minutes with lists.
+    :return: reason to skip the case, or None
+    """
+    if kernel in ("gamma", "re_estimate", "em") and 8 * T * N * N > MAX_WORKSPACE_BYTES:
+        return "T x N x N workspace too large"
+    if engine == "list" and T * N * max(N, M) > MAX_LIST_OPERATIONS:
+        return "too slow with lists"
+    return None
+
+
+def random_case(N, M, T, rng):
+    A = rng.dirichlet(np.ones(N), size=N)
+    B = rng.dirichlet(np.ones(M), size=N)
+    pi = rng.dirichlet(np.ones(N))
+    obs = rng.integers(M, size=T)
+    return A, B, pi, obs
+
+
+def time_kernel(run, min_time=0.2, max_repeats=50):
+    """
+    Run a kernel until min_time seconds have passed or max_repeats runs are done.
+    :return: best and mean time of a run in seconds, and the number of runs
+    """
+    times = []
+    while not times or (len(times) < max_repeats and sum(times) < min_time):
+        start = perf_counter()
+        run()
+        times.append(perf_counter() - start)
+    return min(times), sum(times) / len(times), len(times)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(engines, kernels, grid, min_time=0.2, seed=0):
+    """
+    Time every kernel of every engine on every (N, M, T) of the grid.
+    :return: list of result rows
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for N in grid["N"]:
+        for M in grid["M"]:
+            for T in grid["T"]:
+                A, B, pi, obs = random_case(N, M, T, rng)
+                for engine in engines:
+                    case = {"engine": engine, "N": N, "M": M, "T": T}
+                    skipped = {kernel: skip_reason(engine, kernel, N, M, T) for kernel in kernels}
+                    selected = [kernel for kernel in kernels if skipped[kernel] is None]
+                    runs = ENGINES[engine](A, B, pi, obs, selected) if selected else {}
+                    for kernel in kernels:
+                        if kernel not in selected or kernel not in runs:
+                            results.append(dict(case, kernel=kernel, skipped=skipped[kernel] or "not implemented"))
+                            continue
+                        best, mean, repeats = time_kernel(runs[kernel], min_time)
+                        results.append(dict(case, kernel=kernel, best_s=best, mean_s=mean, repeats=repeats))
+                        print(f"{engine:8} {kernel:12} N={N:<3} M={M:<4} T={T:<7} {1000 * best:10.3f} ms",
+                              file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold=1.1):
+    """
+    Print the ratio of every timing to the same case of a previous results file.
+    :return: number of cases slower than threshold times the baseline
+    """
+    def key(row):
+        return row["engine"], row["kernel"], row["N"], row["M"], row["T"]
+
+    old = {key(row): row for row in baseline["results"] if "best_s" in row}
+    regressions = 0
+    for row in results:
+        if "best_s" not in row or key(row) not in old:
+            continue
+        ratio = row["best_s"] / old[key(row)]["best_s"]
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  slower"
+        print("{:8} {:12} N={:<3} M={:<4} T={:<7} x{:.2f}{}".format(*key(row), ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the HMM kernels over a grid of model and sequence sizes")
+    parser.add_argument("--grid", choices=GRIDS, default="quick")
+    parser.add_argument("--N", type=int, nargs="+", help="numbers of hidden states, overrides the grid")
+    parser.add_argument("--M", type=int, nargs="+", help="numbers of emission symbols, overrides the grid")
+    parser.add_argument("--T", type=int, nargs="+", help="sequence lengths, overrides the grid")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--kernels", nargs="+", choices=KERNELS, default=list(KERNELS))
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent timing every kernel")
+    parser.add_argument("--output", default="benchmark.json", help="results file")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    grid = dict(GRIDS[args.grid])
+    for axis in ("N", "M", "T"):
+        if getattr(args, axis) is not None:
+            grid[axis] = getattr(args, axis)
+
+    results = run_benchmark(args.engines, args.kernels, grid, args.min_time)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "grid": grid,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        print("Regressions:", regressions)
+
+
+if __name__ == "__main__":
+    main()
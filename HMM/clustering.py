@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def histogram_features(counts, smoothing=0.5):
+    """
+    Square roots of the smoothed emission frequencies of every fish, so that
+    euclidean distances between them are Hellinger distances.
+    :param counts: emission histograms (F x M)
+    :return: features (F x M)
+    """
+    counts = np.asarray(counts, dtype=float) + smoothing
+    return np.sqrt(counts / counts.sum(axis=1)[:, None])
+
+
+def kmeans(X, k, n_init=8, max_iters=50, rng=None):
+    """
+    Vectorized k-means with k-means++ seeding, keeping the best of n_init runs.
+    :param X: points (F x D)
+    :param k: number of clusters, at most F
+    :return: cluster of every point (F), centers (k x D) and the inertia
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    k = min(k, len(X))
+    best = None
+    for _ in range(n_init):
+        centers = X[[rng.integers(len(X))]]
+        while len(centers) < k:
+            distances = ((X[:, None, :] - centers[None]) ** 2).sum(axis=2).min(axis=1)
+            p = distances / distances.sum() if distances.sum() > 0 else None
+            centers = np.vstack([centers, X[rng.choice(len(X), p=p)]])
+
+        labels = None
+        for _ in range(max_iters):
+            distances = ((X[:, None, :] - centers[None]) ** 2).sum(axis=2)
+            new_labels = distances.argmin(axis=1)
+            if labels is not None and np.array_equal(labels, new_labels):
+                break
+            labels = new_labels
+            sizes = np.bincount(labels, minlength=k)
+            sums = np.zeros_like(centers)
+            np.add.at(sums, labels, X)
+            # Empty clusters keep their center
+            centers = np.where(sizes[:, None] > 0, sums / np.maximum(sizes, 1)[:, None], centers)
+
+        inertia = distances[np.arange(len(X)), labels].sum()
+        if best is None or inertia < best[2]:
+            best = labels, centers, inertia
+    return best
+
+
+def cluster_fishes(counts, n_species, rng=None):
+    """
+    Group the fishes into n_species clusters from their emission histograms,
+    before any of them is revealed.
+    :param counts: emission histograms (F x M)
+    :return: cluster of every fish (F)
+    """
+    return kmeans(histogram_features(counts), n_species, rng=rng)[0]
@@ -1,6 +1,20 @@
+import pickle
+import struct
 import sys
+from multiprocessing import BufferTooShort
+from multiprocessing.reduction import ForkingPickler
+
+import numpy as np
+
 import constants
 
+# Header of every frame in binary mode: message kind and payload size
+FRAME_HEADER = struct.Struct('<BI')
+# The payload is a pickled message
+KIND_PICKLE = 0
+# The payload is one uint8 observation per fish
+KIND_OBSERVATIONS = 1
+
 
 class Communicator:
     """
@@ -13,6 +27,25 @@ class Communicator:
 
         self.receiver_threshold = receiver_threshold
 
+        # Compact framing with send_bytes/recv_bytes_into instead of pickled dicts
+        self.binary_protocol = False
+        self.receive_buffer = None
+        self.send_buffer = None
+
+        # Size in bytes of the last message received and sent
+        self.received_bytes = 0
+        self.sent_bytes = 0
+
+    def use_binary_protocol(self, enabled=True):
+        """
+        Switch to binary frames. Both ends of the pipes have to agree on it.
+        :param enabled: whether to use the binary protocol
+        :return:
+        """
+        self.binary_protocol = enabled
+        self.receive_buffer = bytearray(4096)
+        self.send_buffer = bytearray(4096)
+
     def set_receive_send_pipes(self, recv_pipe, sender_pipe):
         """
         Set the pipes
@@ -30,13 +63,41 @@ class Communicator:
         """
         if not self.receiver_pipe.poll(self.receiver_threshold):
             return {'timeout': True}
+        elif self.binary_protocol:
+            return self.receive_frame()
         else:
-            msg = self.receiver_pipe.recv()
+            # Same as recv(), keeping the size of the message
+            data = self.receiver_pipe.recv_bytes()
+            self.received_bytes = len(data)
+            msg = ForkingPickler.loads(data)
             self.check_game_over(msg)
             return msg
 
-    @staticmethod
-    def check_game_over(msg):
+    def receive_frame(self):
+        """
+        Receive a binary frame into the reusable buffer. Observation frames are
+        returned as {'observations': array}, where the array is a view on the
+        buffer that is only valid until the next receive.
+        :return:
+        """
+        try:
+            self.receiver_pipe.recv_bytes_into(self.receive_buffer)
+        except BufferTooShort as e:
+            # The exception carries the whole message, keep a larger buffer from now on
+            data = e.args[0]
+            self.receive_buffer = bytearray(2 * len(data))
+            self.receive_buffer[:len(data)] = data
+
+        kind, n = FRAME_HEADER.unpack_from(self.receive_buffer)
+        self.received_bytes = FRAME_HEADER.size + n
+        payload = memoryview(self.receive_buffer)[FRAME_HEADER.size:FRAME_HEADER.size + n]
+        if kind == KIND_OBSERVATIONS:
+            return {'observations': np.frombuffer(payload, dtype=np.uint8)}
+        msg = pickle.loads(payload)
+        self.check_game_over(msg)
+        return msg
+
+    def check_game_over(self, msg):
         """
         Check if game is over and if it is, close process
         :param msg:
@@ -44,12 +105,50 @@ class Communicator:
         """
         if msg.get("game_over"):
             print("Game over!")
+            self.on_game_over()
             sys.exit(0)
 
+    def on_game_over(self):
+        """
+        Called right before the process exits at the end of the game
+        :return:
+        """
+        pass
+
     def sender(self, msg):
         """
         Send message to the sender pipe
         :param msg:
         :return:
         """
-        self.sender_pipe.send(msg)
+        if self.binary_protocol:
+            self.send_frame(KIND_PICKLE, pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL))
+        else:
+            # Same as send(), keeping the size of the message
+            data = ForkingPickler.dumps(msg)
+            self.sent_bytes = len(data)
+            self.sender_pipe.send_bytes(data)
+
+    def send_observations(self, observations):
+        """
+        Send one observation per fish as a packed uint8 frame
+        :param observations: observations ordered by fish id
+        :return:
+        """
+        self.send_frame(KIND_OBSERVATIONS, np.asarray(observations, dtype=np.uint8))
+
+    def send_frame(self, kind, payload):
+        """
+        Send a header and a payload with a single send_bytes call
+        :param kind: KIND_PICKLE or KIND_OBSERVATIONS
+        :param payload: bytes-like payload
+        :return:
+        """
+        payload = memoryview(payload).cast('B')
+        size = FRAME_HEADER.size + len(payload)
+        if len(self.send_buffer) < size:
+            self.send_buffer = bytearray(2 * size)
+        FRAME_HEADER.pack_into(self.send_buffer, 0, kind, len(payload))
+        self.send_buffer[FRAME_HEADER.size:size] = payload
+        self.sender_pipe.send_bytes(self.send_buffer, 0, size)
+        self.sent_bytes = size
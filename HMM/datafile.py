@@ -1,10 +1,22 @@
+import argparse
 import json
+import struct
 from json import JSONEncoder
 
 import numpy as np
 
+# Binary datafiles are a JSON header followed by a raw uint8 block with the
+# observations of every fish, one row per fish, which is memory-mapped on load
+BINARY_MAGIC = b"FISHOBS1"
+BINARY_PREFIX = struct.Struct('<8sI')
+BINARY_ALIGNMENT = 16
+BINARY_SUFFIX = ".fishobs"
+
 
 class Datafile:
+    # Key of the observations block when stored in binary
+    observations_key = None
+
     def __init__(self, ):
         self.data = None
         self.models = None
@@ -12,20 +24,109 @@ class Datafile:
     def load(self, f):
         self.data = json.load(f)
 
+    def load_file(self, filename):
+        """
+        Load a JSON or binary datafile, whichever the file is.
+        """
+        if is_binary(filename):
+            self.load_binary(filename)
+        else:
+            with open(filename) as f:
+                self.load(f)
+        return self
+
+    def load_binary(self, filename):
+        """
+        Load a binary datafile. The observations are a read-only memory map of
+        shape (n_fish x n_steps), so the sequence of a fish is only read from
+        disk when it is used.
+        """
+        with open(filename, 'rb') as f:
+            magic, header_size = BINARY_PREFIX.unpack(f.read(BINARY_PREFIX.size))
+            if magic != BINARY_MAGIC:
+                raise ValueError(f"{filename} is not a binary datafile")
+            header = json.loads(f.read(header_size).decode())
+
+        block = header.pop("block")
+        offset = _aligned(BINARY_PREFIX.size + header_size)
+        if block["shape"][0] * block["shape"][1] == 0:
+            # Empty files cannot be memory-mapped
+            observations = np.zeros(block["shape"], dtype=np.uint8)
+        else:
+            observations = np.memmap(filename, dtype=np.uint8, mode='r', offset=offset, shape=tuple(block["shape"]))
+        header[block["key"]] = observations
+        self.data = header
+
     def save(self, filename):
         with open(filename, 'w') as f:
             json.dump(self.data, f, cls=DatafileEncoder)
 
+    def save_binary(self, filename):
+        """
+        Save the data as a binary datafile, with the observations block as raw
+        uint8 values.
+        """
+        observations = np.asarray(self.data[self.observations_key])
+        if observations.ndim != 2 or (observations.size and (observations.min() < 0 or observations.max() > 255)):
+            raise ValueError("observations must be sequences of equal length with values in 0..255")
+
+        header = {key: value for key, value in self.data.items() if key != self.observations_key}
+        header["block"] = {"key": self.observations_key, "shape": list(observations.shape)}
+        header = json.dumps(header, cls=DatafileEncoder).encode()
+
+        with open(filename, 'wb') as f:
+            f.write(BINARY_PREFIX.pack(BINARY_MAGIC, len(header)))
+            f.write(header)
+            f.write(b"\0" * (_aligned(BINARY_PREFIX.size + len(header)) - BINARY_PREFIX.size - len(header)))
+            f.write(np.ascontiguousarray(observations, dtype=np.uint8).tobytes())
+
 
 class ModelsDatafile(Datafile):
     pass
 
 
 class SequencesDatafile(Datafile):
-    pass
+    observations_key = "sequences"
 
 
 class DatafileEncoder(JSONEncoder):
     def default(self, o):
-        if type(o) is np.ndarray:
+        if isinstance(o, np.ndarray):
             return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+
+
+def _aligned(size):
+    return -(-size // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
+
+
+def is_binary(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def convert(source, destination):
+    """
+    Convert a sequences file from JSON to binary, or from binary to JSON.
+    """
+    datafile = SequencesDatafile()
+    if is_binary(source):
+        datafile.load_binary(source)
+        datafile.save(destination)
+    else:
+        with open(source) as f:
+            datafile.load(f)
+        datafile.save_binary(destination)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a sequences file between the JSON and binary formats")
+    parser.add_argument("source", help="JSON or binary sequences file")
+    parser.add_argument("destination", help="converted file, binary if the source is JSON and vice versa")
+    args = parser.parse_args()
+    convert(args.source, args.destination)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+from time import time
+
+import numpy as np
+
+from baum_welch_numpy import em_step, em_step_batch, em_step_streaming
+
+
+class EMDriver:
+    """
+    Baum-Welch driver with tolerance and deadline based stopping. Every
+    iteration is recorded in trace as a dictionary with the log probability,
+    the elapsed milliseconds and the largest change of A and B.
+    """
+
+    def __init__(self, max_iters=50, tol=None, deadline=None, time_budget=None, dtype=np.float64,
+                 streaming=False, chunk=None):
+        """
+        :param max_iters: maximum number of iterations
+        :param tol: stop once the relative log probability improvement drops below it
+        :param deadline: time() value after which no new iteration is started
+        :param time_budget: seconds available to each fit, from the moment it is called
+        :param dtype: precision of the model and of the EM workspaces, float32 halves their size
+        :param streaming: train single sequences with em_step_streaming, which never
+                          builds the T x N x N di-gammas
+        :param chunk: steps between the checkpoints of the streaming mode, sqrt(T) if None
+        """
+        self.max_iters = max_iters
+        self.tol = tol
+        self.deadline = deadline
+        self.time_budget = time_budget
+        self.dtype = dtype
+        self.streaming = streaming
+        self.chunk = chunk
+
+        self.trace = []
+        self.n_iters = 0
+        self.log_prob = float("-inf")
+        self.stop_reason = None
+
+    def fit(self, A, B, pi, obs, lengths=None, M=None):
+        """
+        Train a model on a single sequence, or on a padded batch if lengths is given.
+        :param obs: observation sequence (T), or padded observations (S x T)
+        :param lengths: number of valid steps of every sequence (S)
+        :param M: number of emission symbols, defaults to the number of columns of B
+        :return: A, B, pi as ndarrays
+        """
+        start = time()
+        deadline = self.deadline
+        if self.time_budget is not None:
+            deadline = min(deadline or float("inf"), start + self.time_budget)
+
+        A = np.ascontiguousarray(A, dtype=self.dtype)
+        B = np.ascontiguousarray(B, dtype=self.dtype)
+        pi = np.asarray(pi, dtype=self.dtype).ravel()
+        obs = np.asarray(obs, dtype=np.intp)
+        if lengths is not None:
+            lengths = np.asarray(lengths, dtype=np.intp)
+            mask = np.arange(obs.shape[1]) < lengths[:, None]
+        if M is None:
+            M = B.shape[1]
+
+        self.trace = []
+        self.n_iters = 0
+        self.stop_reason = "max_iters"
+        old_log_prob = float("-inf")
+        iter_time = 0
+
+        while self.n_iters < self.max_iters:
+            # Do not start an iteration that would end after the deadline
+            if deadline is not None and time() + iter_time > deadline:
+                self.stop_reason = "deadline"
+                break
+
+            iter_start = time()
+            if lengths is None and self.streaming:
+                new_A, new_B, pi, log_prob = em_step_streaming(A, B, pi, obs, M, self.chunk)
+            elif lengths is None:
+                new_A, new_B, pi, log_prob = em_step(A, B, pi, obs, M)
+            else:
+                new_A, new_B, pi, log_prob = em_step_batch(A, B, pi, obs, lengths, M, mask)
+            iter_time = time() - iter_start
+
+            m = min(M, B.shape[1])
+            delta = max(np.abs(new_A - A).max(), np.abs(new_B[:, :m] - B[:, :m]).max())
+            A, B = new_A, new_B
+            self.n_iters += 1
+            self.log_prob = log_prob
+            self.trace.append({
+                "iteration": self.n_iters,
+                "log_prob": float(log_prob),
+                "elapsed_ms": 1000 * (time() - start),
+                "delta": float(delta),
+            })
+
+            if log_prob <= old_log_prob:
+                self.stop_reason = "log_prob"
+                break
+            if self.tol is not None and log_prob - old_log_prob < self.tol * abs(log_prob):
+                self.stop_reason = "tol"
+                break
+            old_log_prob = log_prob
+
+        return A, B, pi
+
+    def fit_restarts(self, A, B, pi, obs, lengths, M=None, n_restarts=8, noise=0.5, rng=None):
+        """
+        Train several perturbed copies of the model at once, stacked along a
+        leading batch dimension, and keep the one with the highest log
+        probability. The first copy is the model itself. With a deadline or a
+        time budget the number of copies is lowered to what fits in the time
+        left, measured with a first iteration of the model alone.
+        :param n_restarts: maximum number of copies
+        :param noise: weight of the random rows mixed into every copy
+        :return: A, B, pi of the best copy as ndarrays
+        """
+        start = time()
+        deadline = self.deadline
+        if self.time_budget is not None:
+            deadline = min(deadline or float("inf"), start + self.time_budget)
+        if rng is None:
+            rng = np.random.default_rng()
+
+        A = np.ascontiguousarray(A, dtype=self.dtype)
+        B = np.ascontiguousarray(B, dtype=self.dtype)
+        pi = np.asarray(pi, dtype=self.dtype).ravel()
+        obs = np.asarray(obs, dtype=np.intp)
+        lengths = np.asarray(lengths, dtype=np.intp)
+        mask = np.arange(obs.shape[1]) < lengths[:, None]
+        if M is None:
+            M = B.shape[1]
+
+        K = n_restarts
+        if deadline is not None:
+            iter_start = time()
+            em_step_batch(A, B, pi, obs, lengths, M, mask)
+            # The cost of an iteration grows about linearly with the number of copies
+            iter_cost = (time() - iter_start) * self.max_iters
+            K = int(min(n_restarts, max(1, (deadline - time()) // max(iter_cost, 1e-9))))
+
+        def perturb(X):
+            random_rows = rng.dirichlet(np.ones(X.shape[-1]), size=(K - 1,) + X.shape[:-1])
+            return np.concatenate([X[None], (1 - noise) * X + noise * random_rows.astype(X.dtype)])
+
+        A, B, pi = perturb(A), perturb(B), perturb(pi)
+
+        self.trace = []
+        self.n_iters = 0
+        self.stop_reason = "max_iters"
+        old_log_prob = np.full(K, float("-inf"))
+        # Copies still improving, the others keep their last parameters
+        active = np.ones(K, dtype=bool)
+        iter_time = 0
+
+        while self.n_iters < self.max_iters:
+            if deadline is not None and time() + iter_time > deadline:
+                self.stop_reason = "deadline"
+                break
+
+            iter_start = time()
+            new_A, new_B, new_pi, log_prob = em_step_batch(A[active], B[active], pi[active], obs, lengths, M, mask)
+            iter_time = time() - iter_start
+
+            improved = log_prob > old_log_prob[active]
+            if self.tol is not None:
+                improved &= log_prob - old_log_prob[active] >= self.tol * np.abs(log_prob)
+            # Only take the re-estimates of the copies whose old parameters improved
+            ids = np.flatnonzero(active)
+            A[ids[improved]], B[ids[improved]], pi[ids[improved]] = new_A[improved], new_B[improved], new_pi[improved]
+            old_log_prob[ids] = np.maximum(old_log_prob[ids], log_prob)
+            active[ids[~improved]] = False
+
+            self.n_iters += 1
+            self.log_prob = old_log_prob.max()
+            self.trace.append({
+                "iteration": self.n_iters,
+                "log_prob": float(self.log_prob),
+                "elapsed_ms": 1000 * (time() - start),
+                "restarts": int(active.sum()),
+            })
+            if not active.any():
+                self.stop_reason = "log_prob" if self.tol is None else "tol"
+                break
+
+        self.restart_log_probs = old_log_prob
+        best = int(np.argmax(old_log_prob))
+        return A[best], B[best], pi[best]
@@ -0,0 +1,44 @@
+import math
+
+import numpy as np
+
+
+def forward(A, B, pi, observations, scaled=False):
+    """
+    Streaming forward algorithm. The observations are consumed one at a time,
+    so any iterable or generator can be evaluated, and the alphas live in two
+    preallocated buffers.
+    :param A: transition matrix (N x N)
+    :param B: emission matrix (N x M)
+    :param pi: initial state distribution (N)
+    :param observations: iterable of observations
+    :param scaled: normalize the alphas at every step and return the log-probability
+    :return: probability of the observations, or its log if scaled
+    """
+    A = np.asarray(A, dtype=float)
+    B_T = np.ascontiguousarray(np.asarray(B, dtype=float).T)
+    pi = np.asarray(pi, dtype=float).ravel()
+
+    observations = iter(observations)
+    first = next(observations, None)
+    if first is None:
+        return 0.0 if scaled else 1.0
+
+    alpha = pi * B_T[first]
+    buffer = np.empty_like(alpha)
+    log_prob = 0.0
+
+    for obs in observations:
+        if scaled:
+            c = alpha.sum()
+            if c == 0:
+                return float("-inf")
+            log_prob += math.log(c)
+            alpha /= c
+        np.dot(alpha, A, out=buffer)
+        np.multiply(buffer, B_T[obs], out=alpha)
+
+    if scaled:
+        c = alpha.sum()
+        return log_prob + math.log(c) if c > 0 else float("-inf")
+    return float(alpha.sum())
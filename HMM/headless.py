@@ -0,0 +1,143 @@
+import argparse
+import importlib
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import constants
+from model_store import ModelStore, POLICIES
+from precision import DTYPES
+from sequences import Sequences
+
+
+class HeadlessGame:
+    """
+    Replays a sequences file against an HMM player without the GUI. The player
+    is driven in-process as fast as it answers, with the same guessing,
+    reveal and scoring rules as FishingDerbyHMMApp.
+    """
+
+    def __init__(self, observations_sequence, time_threshold=constants.STEP_TIME_THRESHOLD):
+        """
+        :param observations_sequence: data of a JSON or binary sequences file
+        :param time_threshold: seconds a step may take before the game is lost
+        """
+        self.observations_sequence = observations_sequence
+        self.time_threshold = time_threshold
+        self.seq_types_fishes = observations_sequence["fish_types"]
+        # One column per step, a view when the sequences are memory-mapped
+        self.sequences = np.asarray(observations_sequence["sequences"], dtype=np.uint8)
+        self.num_fishes = len(self.seq_types_fishes)
+
+    def evaluate_guess(self, fish_id, guess, is_revealed):
+        """
+        Same rules as FishingDerbyHMMApp.evaluate_guess.
+        :return: whether the guess was correct and whether it counts as a new guess
+        """
+        correct = guess == self.seq_types_fishes[fish_id]
+        new_guess = not is_revealed[fish_id]
+        is_revealed[fish_id] = True
+        return correct, new_guess
+
+    def run(self, player):
+        """
+        Play a whole game.
+        :param player: instance of a PlayerControllerHMMAbstract subclass
+        :return: dictionary with the score, the number of guesses, whether the
+                 player timed out and the duration of every step in seconds
+        """
+        n_steps = self.observations_sequence["n_seq"]
+        is_revealed = [False] * self.num_fishes
+        correct_guesses = 0
+        total_guesses = 0
+        timeout = False
+        step_times = []
+
+        # The player sizes its store and paces its guesses from these, not only the constants
+        player.n_steps = n_steps
+        player.time_threshold = self.time_threshold
+        player.init_parameters()
+        for step in range(n_steps):
+            observations = self.sequences[:, step].tolist()
+
+            # The time of a step covers the guess and the reveal that follows it,
+            # as the game only sends the next step once both are done
+            start = perf_counter()
+            guess_result = player.guess(step + 1, observations)
+            if guess_result is None:
+                pass
+            elif type(guess_result) is tuple:
+                fish_id, fish_type = guess_result
+                correct, new_guess = self.evaluate_guess(fish_id, fish_type, is_revealed)
+                if new_guess:
+                    total_guesses += 1
+                    correct_guesses += correct
+                player.reveal(correct, fish_id, self.seq_types_fishes[fish_id])
+            else:
+                raise Exception(f'Wrong return type: {type(guess_result)}')
+            step_times.append(perf_counter() - start)
+
+            if step_times[-1] >= self.time_threshold:
+                timeout = True
+                correct_guesses = 0
+                break
+            if total_guesses == self.num_fishes:
+                break
+
+        if not timeout:
+            player.end_game()
+
+        return {
+            "score": correct_guesses,
+            "guesses": total_guesses,
+            "n_fish": self.num_fishes,
+            "steps": len(step_times),
+            "timeout": timeout,
+            "step_times": step_times,
+        }
+
+
+def load_player_class(name):
+    """
+    :param name: player class as "module:Class"
+    :return: the class
+    """
+    module_name, class_name = name.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play an HMM fishing derby game without the GUI")
+    parser.add_argument("sequences", nargs="?", help="JSON or binary sequences file, JSON from stdin if not given")
+    parser.add_argument("--player", default="player:PlayerControllerHMM",
+                        help="player class as module:Class")
+    parser.add_argument("--time-threshold", type=float, default=constants.STEP_TIME_THRESHOLD)
+    parser.add_argument("--model-store", help="npz file keeping the species models across games")
+    parser.add_argument("--model-store-policy", choices=POLICIES, default="warm")
+    parser.add_argument("--precision", choices=DTYPES, default="float64")
+    parser.add_argument("--online-em", action="store_true", help="update the models online from the revealed fishes")
+    args = parser.parse_args()
+
+    sequences = Sequences()
+    if args.sequences is None:
+        sequences.load(sys.stdin)
+    else:
+        sequences.load_file(args.sequences)
+
+    player = load_player_class(args.player)()
+    player.precision = args.precision
+    player.online_em = args.online_em
+    if args.model_store is not None:
+        player.model_store = ModelStore(args.model_store, args.model_store_policy)
+    player.init_workers()
+    result = HeadlessGame(sequences.data, args.time_threshold).run(player)
+
+    if result["timeout"]:
+        print("Timeout error!")
+    print("Score:", result["score"], "/", result["n_fish"], "\tSteps:", result["steps"],
+          "\tSlowest step:", round(max(result["step_times"]), 4), "s")
+
+
+if __name__ == "__main__":
+    main()
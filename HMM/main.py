@@ -23,6 +23,20 @@ class Settings:
         self.window_scale = None
         # Time threshold
         self.time_threshold = None
+        # Retrain the HMM models in a separate worker process
+        self.training_worker = None
+        # Exchange binary frames instead of pickled dicts between game and player
+        self.binary_protocol = None
+        # npz file keeping the species models across games, and how games start from it
+        self.model_store = None
+        self.model_store_policy = None
+        self.model_store_blend = None
+        # JSON file the player writes a per-step profile to at the end of the game
+        self.profile_trace = None
+        # Precision of the player's models and EM workspaces, float64 or float32
+        self.precision = None
+        # Update the species models online with the new emissions of the revealed fishes
+        self.online_em = None
 
     def load_from_dict(self, dictionary):
         """
@@ -33,6 +47,14 @@ class Settings:
         self.frames_per_second = dictionary.get("frames_per_second", 20)
         self.window_scale = dictionary.get("window_scale", 1.0)
         self.time_threshold = dictionary.get("time_threshold", 5e-1)
+        self.training_worker = dictionary.get("training_worker", False)
+        self.binary_protocol = dictionary.get("binary_protocol", False)
+        self.model_store = dictionary.get("model_store", None)
+        self.model_store_policy = dictionary.get("model_store_policy", "warm")
+        self.model_store_blend = dictionary.get("model_store_blend", 0.5)
+        self.profile_trace = dictionary.get("profile_trace", None)
+        self.precision = dictionary.get("precision", "float64")
+        self.online_em = dictionary.get("online_em", False)
 
 
 class Application(SettingLoader):
@@ -65,6 +87,11 @@ class Application(SettingLoader):
         self.player_controller.load_settings(self.settings)
         self.player_controller.set_receive_send_pipes(
             self.player_pipe_receive, self.player_pipe_send)
+        self.player_controller.init_workers()
+
+        if self.settings.binary_protocol:
+            self.game_controller.use_binary_protocol()
+            self.player_controller.use_binary_protocol()
 
         # Set player loop to use
         self.select_and_launch_player_loop()
@@ -0,0 +1,50 @@
+import sys
+
+import numpy as np
+
+
+def read_lines(stream=None):
+    """
+    Read every non-empty line of the input as a flat float array.
+    :param stream: binary stream to read, sys.stdin.buffer by default
+    :return: list of 1-D ndarrays, one per line
+    """
+    if stream is None:
+        stream = sys.stdin.buffer
+    return [np.fromstring(line.decode(), dtype=float, sep=' ')
+            for line in stream.read().splitlines() if line.strip()]
+
+
+def parse_matrix(p_matrix_item):
+    """
+    Build a matrix from a "rows cols values..." line.
+    :param p_matrix_item: the numbers of the line
+    :return: ndarray of shape rows x cols
+    """
+    l_matrix_item = np.asarray(p_matrix_item, dtype=float)
+    l_rows = int(l_matrix_item[0])
+    l_cols = int(l_matrix_item[1])
+    return l_matrix_item[2:2 + l_rows * l_cols].reshape(l_rows, l_cols)
+
+
+def parse_sequence(p_seq_item):
+    """
+    Build an observation sequence from a "T o_1 ... o_T" line.
+    :param p_seq_item: the numbers of the line
+    :return: integer ndarray of length T
+    """
+    l_seq_item = np.asarray(p_seq_item)
+    return l_seq_item[1:1 + int(l_seq_item[0])].astype(np.intp)
+
+
+def read_model(stream=None, with_sequence=True):
+    """
+    Read the A, B and pi matrices, and optionally an observation sequence,
+    in the Kattis format.
+    :return: A, B, pi (1 x N) and, if with_sequence, the observation sequence
+    """
+    lines = read_lines(stream)
+    model = [parse_matrix(line) for line in lines[:3]]
+    if with_sequence:
+        model.append(parse_sequence(lines[3]))
+    return tuple(model)
@@ -0,0 +1,111 @@
+import os
+import tempfile
+
+import numpy as np
+
+POLICIES = ("warm", "blend", "cold")
+
+# Base of a model that started from no stored entry, see ModelStore.update
+EMPTY = (None, None, None, 0)
+
+
+class ModelStore:
+    """
+    Species models kept on disk across games, in an npz file keyed by species
+    id and model shape. Every model is stored with the number of sequences it
+    was trained on, so that the models of a new game are merged into the
+    stored ones as a running average.
+    """
+
+    def __init__(self, path, policy="warm", blend=0.5):
+        """
+        :param path: npz file of the store, created at the first save
+        :param policy: how stored models initialize a game's models: "warm" uses
+                       them as they are, "blend" mixes them with the fresh models
+                       and "cold" ignores them
+        :param blend: weight of the stored model with the "blend" policy
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown model store policy: {policy}")
+        self.path = path
+        self.policy = policy
+        self.blend = blend
+        # Dictionary from key to (A, B, pi, number of sequences)
+        self.models = {}
+
+    @staticmethod
+    def key(species, n_states, n_emissions):
+        return f"{species}_{n_states}x{n_emissions}"
+
+    def load(self):
+        self.models = {}
+        if not os.path.exists(self.path):
+            return self
+        with np.load(self.path) as arrays:
+            keys = {name.rsplit("_", 1)[0] for name in arrays.files}
+            for key in keys:
+                self.models[key] = (arrays[key + "_A"], arrays[key + "_B"], arrays[key + "_pi"],
+                                    int(arrays[key + "_n"]))
+        return self
+
+    def get(self, species, n_states, n_emissions):
+        """
+        :return: stored A, B, pi and number of sequences of a model, None if not stored
+        """
+        return self.models.get(self.key(species, n_states, n_emissions))
+
+    def initial_model(self, species, A, B, pi):
+        """
+        Apply the policy to the fresh model of a species.
+        :return: A, B and pi to start the game with, and whether they come from the store
+        """
+        A, B, pi = np.asarray(A, dtype=float), np.asarray(B, dtype=float), np.asarray(pi, dtype=float).ravel()
+        stored = self.get(species, *B.shape)
+        if stored is None or self.policy == "cold":
+            return A, B, pi, False
+        if self.policy == "warm":
+            return stored[0].copy(), stored[1].copy(), stored[2].copy(), True
+
+        w = self.blend
+        return w * stored[0] + (1 - w) * A, w * stored[1] + (1 - w) * B, w * stored[2] + (1 - w) * pi, True
+
+    def update(self, species, A, B, pi, n_sequences, base=None):
+        """
+        Merge a model trained on n_sequences sequences into the store.
+        :param base: the (A, B, pi, number of sequences) entry the model was
+                     started from, which it already accounts for, or EMPTY if
+                     there was none. Models updated several times in a game
+                     must pass the same base every time, or they are merged
+                     with their own earlier versions. If None, the entry
+                     currently in the store is used.
+        """
+        A, B, pi = np.asarray(A, dtype=float), np.asarray(B, dtype=float), np.asarray(pi, dtype=float).ravel()
+        key = self.key(species, *B.shape)
+        stored = self.models.get(key) if base is None else base
+        if stored is None or stored[3] == 0:
+            self.models[key] = (A, B, pi, n_sequences)
+            return
+
+        n_stored = stored[3]
+        w = n_sequences / (n_stored + n_sequences)
+        self.models[key] = ((1 - w) * stored[0] + w * A, (1 - w) * stored[1] + w * B,
+                            (1 - w) * stored[2] + w * pi, n_stored + n_sequences)
+
+    def save(self):
+        """
+        Write the store atomically, so an interrupted game never leaves a
+        truncated file behind.
+        """
+        arrays = {}
+        for key, (A, B, pi, n) in self.models.items():
+            arrays[key + "_A"], arrays[key + "_B"], arrays[key + "_pi"], arrays[key + "_n"] = A, B, pi, n
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class ObservationStore:
+    """
+    Preallocated n_fish x n_steps array holding the observations of every
+    fish. The sequences handed out are views on it, so they are never copied.
+    It can be backed by shared memory, e.g. the buffer of a TrainingWorker,
+    so another process reads the sequences without them being sent over.
+    """
+
+    def __init__(self, n_fish, n_steps, dtype=np.uint8, buffer=None):
+        """
+        :param buffer: multiprocessing RawArray of n_fish * n_steps items of dtype
+                       to keep the observations in, a private array if None
+        """
+        self.buffer = buffer
+        if buffer is None:
+            self.data = np.zeros((n_fish, n_steps), dtype=dtype)
+        else:
+            self.data = np.frombuffer(buffer, dtype=dtype).reshape(n_fish, n_steps)
+        # Number of steps written so far
+        self.cursor = 0
+
+    def __len__(self):
+        return self.cursor
+
+    def append(self, observations):
+        """
+        Write the observations of one step, one per fish.
+        """
+        if self.cursor == self.data.shape[1]:
+            # More steps than expected, double the capacity
+            grown = np.zeros((self.data.shape[0], 2 * self.data.shape[1] or 1), dtype=self.data.dtype)
+            grown[:, :self.cursor] = self.data
+            self.data = grown
+            # The observations from now on are only in this process
+            self.buffer = None
+        self.data[:, self.cursor] = observations
+        self.cursor += 1
+
+    @property
+    def shared(self):
+        return self.buffer is not None
+
+    def sequence(self, fish_id):
+        """
+        :return: view on the observations of a fish so far
+        """
+        return self.data[fish_id, :self.cursor]
+
+    def window(self, start=0, stop=None):
+        """
+        :return: view on the observations of every fish between two steps (n_fish x steps)
+        """
+        if stop is None:
+            stop = self.cursor
+        return self.data[:, start:stop]
@@ -0,0 +1,84 @@
+import numpy as np
+
+from baum_welch_numpy import alpha_pass, epsilon
+
+
+class OnlineEM:
+    """
+    Stepwise (online) EM for one species model, fed with the new emission of
+    every fish of that species at every step. It keeps the filtered state
+    distribution of each fish and running averages of the expected transition
+    and emission statistics, so a step costs O(N^2) per fish:
+
+        S <- (1 - eta) S + eta s,    eta = min(1, F (k + offset) ^ -exponent)
+
+    where s are the expected statistics of the F emissions of the step given
+    the filters, k the number of emissions the statistics already account for,
+    and A and B are the row-normalized S. With exponent 1 this is a running
+    average over all the emissions seen.
+    """
+
+    def __init__(self, A, B, pi, n_observations=0, exponent=0.8, offset=2):
+        """
+        :param exponent: decay of the step size, in (0.5, 1] for convergence
+        :param offset: delays the decay, larger values make the first steps smaller
+        """
+        self.exponent = exponent
+        self.offset = offset
+        # Filtered state distribution of every fish, by fish id
+        self.filters = {}
+        self.reset(A, B, pi, n_observations)
+
+    def reset(self, A, B, pi, n_observations=0):
+        """
+        Restart the statistics from a model, e.g. after it was retrained in batch.
+        The filters of the fishes are kept.
+        :param n_observations: number of emissions the model was trained on, over
+                               all sequences, which starts the step size decay further along
+        """
+        self.A = np.array(A, dtype=float)
+        self.B = np.array(B, dtype=float)
+        self.pi = np.asarray(pi, dtype=float).ravel()
+        N = len(self.A)
+        # Joint statistics of (state, next state) and (state, emission), summing to one
+        self.stats_A = self.A / N
+        self.stats_B = self.B / N
+        self.k = n_observations
+
+    def add_fish(self, fish_id, observations):
+        """
+        Start following a fish, with its filter computed over the observations so far.
+        """
+        self.filters[fish_id] = alpha_pass(self.A, self.B, self.pi, observations)[0][-1]
+
+    def step(self, observations):
+        """
+        Update the model with the next emission of the fishes followed.
+        :param observations: observations of every fish at this step, indexed by fish id
+        :return: the updated A and B
+        """
+        if not self.filters:
+            return self.A, self.B
+        fish_ids = list(self.filters)
+        obs = np.asarray(observations)[fish_ids]
+        filters = np.array([self.filters[fish_id] for fish_id in fish_ids])
+
+        # Posterior of the (previous state, new state) pair of every fish
+        xi = filters[:, :, None] * self.A[None] * self.B.T[obs][:, None, :]
+        xi /= xi.sum(axis=(1, 2))[:, None, None] + epsilon
+        gamma = xi.sum(axis=1)
+
+        step_A = xi.mean(axis=0)
+        step_B = np.zeros_like(self.stats_B)
+        np.add.at(step_B.T, obs, gamma / len(fish_ids))
+
+        eta = min(1.0, len(fish_ids) * (self.k + self.offset) ** -self.exponent)
+        self.k += len(fish_ids)
+        self.stats_A = (1 - eta) * self.stats_A + eta * step_A
+        self.stats_B = (1 - eta) * self.stats_B + eta * step_B
+        self.A = self.stats_A / (self.stats_A.sum(axis=1)[:, None] + epsilon)
+        self.B = self.stats_B / (self.stats_B.sum(axis=1)[:, None] + epsilon)
+
+        for fish_id, posterior in zip(fish_ids, gamma):
+            self.filters[fish_id] = posterior
+        return self.A, self.B
@@ -2,188 +2,44 @@
 
 from player_controller_hmm import PlayerControllerHMMAbstract
 from constants import *
+from baum_welch_numpy import pad_sequences
+from clustering import cluster_fishes
+from em_driver import EMDriver
+from model_store import EMPTY, ModelStore
+from observation_store import ObservationStore
+from online_em import OnlineEM
+from precision import DTYPES
+from scheduler import GuessScheduler
+from scoring import ForwardCache
+from training_worker import TrainingWorker
 import random
 import numpy as np
-import sys
 
-
-epsilon = sys.float_info.epsilon
-
-def calculate_temp(l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi, l_obs_seq):
-
-    # We are flipping the observation sequence because the Beta pass
-    # operations are the same as the alpha pass operations
-    # The output of Beta pass needs to be flipped so that the index will
-    # correspond to the right time stamp
-    
-    #l_M = len(set(l_obs_seq))           # Count of unique elements in obs seq 
-    l_M = len(l_obs_seq)
-    l_N = len(l_trans_matrix_A)
-    l_T = len(l_obs_seq)
-
-    l_iter_cnt      = 0
-    l_max_iters     = 5
-    l_old_log_prob  = float("-inf")
-    l_log_prob      = 1
-
-    while l_iter_cnt < l_max_iters and l_log_prob > l_old_log_prob:
-        l_iter_cnt += 1
-        #print("Iteration count : ", str(l_iter_cnt))
-        if l_iter_cnt != 1:
-            l_old_log_prob = l_log_prob
-            
-        l_alpha_vals, l_c_val = f_alpha_pass(l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi, l_obs_seq, l_N, l_T)
-        
-        l_c_beta    = l_c_val[::-1]
-        l_seq_beta  = l_obs_seq[::-1]
-        l_beta_flip = f_beta_pass(l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi, l_seq_beta, l_c_beta, l_N, l_T)
-        l_beta_vals = l_beta_flip[::-1]
-
-        l_gamma_list, l_gamma_ij_list = f_comp_gamma(l_trans_matrix_A, l_obs_matrix_B, l_obs_seq, l_alpha_vals, l_beta_vals, l_N, l_T)
-
-        l_init_prob_pi, l_trans_matrix_A, l_obs_matrix_B = f_re_estimate(l_gamma_list, l_gamma_ij_list, l_obs_seq, l_M, l_N, l_T)
-
-        l_log_prob = f_prob_log(l_c_val, l_T) 
+# Number of hidden states of every species model
+N_HIDDEN_STATES = 1
+# EM iterations per retraining, fewer when the models start from the model store
+EM_ITERS = 5
+WARM_EM_ITERS = 2
+# Perturbed copies trained together the first time a species model is trained
+N_RESTARTS = 8
+# Pseudo-count of every species in the prior given by the revealed fishes of a cluster
+CLUSTER_PRIOR_COUNT = 1.0
+
+
+def calculate_temp(l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi, l_obs_seqs, l_driver=None, l_restarts=1):
+    # All the sequences of a species are trained together in one batch
+    l_obs, l_lengths = pad_sequences(l_obs_seqs)
+    if l_driver is None:
+        l_driver = EMDriver(max_iters=EM_ITERS)
+    if l_restarts > 1:
+        l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi = l_driver.fit_restarts(
+            l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi, l_obs, l_lengths, N_EMISSIONS, l_restarts)
+    else:
+        l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi = l_driver.fit(
+            l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi, l_obs, l_lengths, N_EMISSIONS)
 
     return l_trans_matrix_A, l_obs_matrix_B, l_init_prob_pi
 
-
-def f_create_matrix(p_matrix_item):
-    #l_matrix_list   = list(p_matrix_item.split())
-    l_matrix_elem   = list(map(float, p_matrix_item[2:]))
-    l_rows          = int(p_matrix_item[0])
-    l_cols          = int(p_matrix_item[1])
-    l_matrix        = []
-    for i_row in range(l_rows):
-        t_row_list = []
-        for i_col in range(l_cols):
-            if l_matrix_elem[i_col] not in l_matrix:
-                t_row_list.append(l_matrix_elem[l_cols * i_row + i_col])
-        l_matrix.append(t_row_list)
-    return l_matrix
-
-
-def f_alpha_pass(p_trans_matrix_A, p_obs_matrix_B, p_init_prob_pi, p_obs_seq, p_N, p_T):
-    l_alpha_list = []
-    l_c = []
-    for t in range(p_T):
-        t_c = 0
-        t_alpha_list = []
-        t_pi = p_init_prob_pi[0]
-        for i in range(p_N):
-            if t == 0:
-                t_alpha = t_pi[i] * p_obs_matrix_B[i][p_obs_seq[t]]
-                t_c += t_alpha
-                t_alpha_list.append(t_alpha)
-            else:
-                t_alpha = 0
-                for j in range(p_N):
-                    #print("len l_alpha_list: ", len(l_alpha_list))
-                    t_alpha += l_alpha_list[t - 1][j] * p_trans_matrix_A[j][i] * p_obs_matrix_B[i][p_obs_seq[t]]
-                t_c += t_alpha
-                t_alpha_list.append(t_alpha)
-        # c_t_r is the reciprocal of t_c (c at time t)
-        c_t_r = 1 / (t_c + epsilon)
-        for m in range(p_N):
-            t_alpha_list[m] = c_t_r * t_alpha_list[m]
-        l_c.append(c_t_r)
-        l_alpha_list.append(t_alpha_list)
-
-    return l_alpha_list, l_c
-
-
-def f_beta_pass(a, b, p, seq, c, N, T):
-    beta_list = []
-    pi_temp = p[0]
-    for t in range(T):
-        beta_temp_list = []
-        for i in range(N):     # to state
-            if t == 0:
-                beta = c[t]
-                beta_temp_list.append(beta)
-            else:
-                sum_term = 0
-                for j in range(N):     # from state
-                    sum_term += beta_list[t-1][j] * a[i][j] * b[j][seq[t-1]]
-                beta_temp_list.append(sum_term)
-        if t > 0:
-            for m in range(N):
-                beta_temp_list[m] = c[t] * beta_temp_list[m]
-        beta_list.append(beta_temp_list)
-
-    return beta_list
-    
-    
-def f_comp_gamma(a, b, seq, alpha_list, beta_list, N, T):
-    gama_list = []
-    gama_ij_list = []
-    for t in range(T-1):
-        gama_temp_list = []
-        gama_ij_temp_list = []
-        for i in range(N):
-            gama_val_temp = []
-            gama = 0
-            for j in range(N):
-                gama_ij = alpha_list[t][i] * a[i][j] * b[j][seq[t+1]] * beta_list[t + 1][j]
-                gama += gama_ij
-                gama_val_temp.append(gama_ij)
-            gama_temp_list.append(gama)
-            gama_ij_temp_list.append(gama_val_temp)
-        gama_list.append(gama_temp_list)
-        gama_ij_list.append(gama_ij_temp_list)
-    gama_temp_list = []
-    alpha_temp_list = alpha_list[t+1]
-    for k in range(N):
-        gama_temp_list.append(alpha_temp_list[k])
-    gama_list.append(gama_temp_list)
-    return gama_list, gama_ij_list
-
-
-def f_re_estimate(gama_list, gama_ij_list, seq, M, N, T):
-    # Re-estimate value of pi
-    pi_temp_list = []
-    for i in range(N):
-        pi_temp_list.append(gama_list[0][i])
-
-    # Re-estimating transition matrix A
-    trans_mat_new = []
-    for i in range(N):
-        denom = 0
-        trans_mat_temp_list = []
-        for t in range(T-1):
-            denom += gama_list[t][i]
-        for j in range(N):
-            numer = 0
-            for t in range(T-1):
-                gama_temp_i = gama_ij_list[t][i]
-                numer += gama_temp_i[j]
-            trans_mat_temp_list.append(numer/(denom + epsilon))
-        trans_mat_new.append(trans_mat_temp_list)
-
-    # Re-estimating transition matrix B
-    obs_mat_new = []
-    for i in range(N):
-        denom = 0
-        obs_mat_temp_list = []
-        for t in range(T):
-            denom += gama_list[t][i]
-        for j in range(M):
-            numer = 0
-            for t in range(T):
-                if seq[t] == j:
-                    numer += gama_list[t][i]
-            obs_mat_temp_list.append(numer / (denom + epsilon))
-        obs_mat_new.append(obs_mat_temp_list)
-
-    return [pi_temp_list], trans_mat_new, obs_mat_new
-
-
-def f_prob_log(c, T):
-    logprob = 0
-    for i in range(T):
-        logprob -= np.log(c[i])
-    return logprob
-
 def dot_prod(matrix_a, matrix_b):
     return [[a * b for a, b in zip(matrix_a[0], matrix_b)]]
 
@@ -209,22 +65,50 @@ def forward_algorithm(fish, model):
     return sum(alpha[0])
 
 class Model:
-    def __init__(self, species, emissions):
-        self.PI = [generate_row_stochastic(species)]
-        self.A = [generate_row_stochastic(species) for _ in range(species)]
-        self.B = [generate_row_stochastic(emissions) for _ in range(species)]
+    """
+    Species model, with its parameters kept as contiguous arrays of dtype.
+    PI is a 1 x N row.
+    """
+
+    def __init__(self, species, emissions, dtype=np.float64):
+        self.dtype = dtype
+        self.set_PI([generate_row_stochastic(species)])
+        self.set_A([generate_row_stochastic(species) for _ in range(species)])
+        self.set_B([generate_row_stochastic(emissions) for _ in range(species)])
 
     def set_A(self, A):
-        self.A = A
+        self.A = np.ascontiguousarray(A, dtype=self.dtype)
 
     def set_B(self, B):
-        self.B = B
+        self.B = np.ascontiguousarray(B, dtype=self.dtype)
 
     def set_PI(self, PI):
-        self.PI = PI
+        self.PI = np.ascontiguousarray(PI, dtype=self.dtype).reshape(1, -1)
 
 
 class PlayerControllerHMM(PlayerControllerHMMAbstract):
+    training_worker = None
+    model_store = None
+    # Precision of the EM workspaces and of the forward cache, a key of DTYPES
+    precision = "float64"
+    # Length of the game and seconds per step, set by headless runs of games of other sizes
+    n_steps = N_STEPS
+    time_threshold = STEP_TIME_THRESHOLD
+    # Update the species models with the new emissions of the revealed fishes at every step,
+    # off as it did not measurably improve the scores
+    online_em = False
+    # Cluster the fishes before the first guess and guess first the ones with revealed cluster mates
+    cluster_order = True
+
+    def init_workers(self):
+        """
+        Start the background training process if enabled in the settings.
+        """
+        if self.settings is not None and self.settings.training_worker:
+            self.training_worker = TrainingWorker(N_SPECIES, N_HIDDEN_STATES, N_EMISSIONS, N_FISH, self.n_steps,
+                                                  dtype=DTYPES[self.settings.precision])
+            self.training_worker.start()
+
     def init_parameters(self):
         """
         In this function you should initialize the parameters you will need,
@@ -233,15 +117,140 @@ class PlayerControllerHMM(PlayerControllerHMMAbstract):
         #self.seen_fishes = set()
         #self.seen_species = set()
 
-        self.models_fish = [Model(1, N_EMISSIONS) for _ in range(N_SPECIES)]
+        if self.settings is not None:
+            self.precision = self.settings.precision
+            self.online_em = self.settings.online_em
+            self.time_threshold = self.settings.time_threshold
+        self.dtype = DTYPES[self.precision]
+
+        self.models_fish = [Model(N_HIDDEN_STATES, N_EMISSIONS, self.dtype) for _ in range(N_SPECIES)]
+        self.em_iters = EM_ITERS
+        self.init_model_store()
+
+        self.init_fishes(N_FISH)
 
-        self.fishes = [(i, []) for i in range(N_FISH)]
+        # Observations of the revealed fishes of every species
+        self.species_obs = [[] for _ in range(N_SPECIES)]
 
-    def update_model(self, model_id):
-        A, B, PI = calculate_temp(self.models_fish[model_id].A, self.models_fish[model_id].B, self.models_fish[model_id].PI, self.obs)
+        # Retraining is queued by reveal() and run by the scheduler within each step's budget
+        self.em_driver = EMDriver(max_iters=self.em_iters, tol=1e-4, dtype=self.dtype)
+        # Number of revealed sequences every model was last retrained on, and sent to the worker
+        self.trained = [0] * N_SPECIES
+        self.submitted = [0] * N_SPECIES
+        # Stepwise EM of every species with a revealed fish
+        self.online = [None] * N_SPECIES
+        self.scheduler = GuessScheduler(self.time_threshold, self.n_steps)
+
+    def init_model_store(self):
+        """
+        Start the species models from the models of previous games, if a model
+        store is configured.
+        """
+        if self.model_store is None and self.settings is not None and self.settings.model_store:
+            self.model_store = ModelStore(self.settings.model_store, self.settings.model_store_policy,
+                                          self.settings.model_store_blend)
+        if self.model_store is None:
+            return
+
+        self.model_store.load()
+        # Stored entry every species started from, merged with its retrained model
+        self.store_base = []
+        for species, model in enumerate(self.models_fish):
+            A, B, PI, warm = self.model_store.initial_model(species, model.A, model.B, model.PI)
+            model.set_A(A)
+            model.set_B(B)
+            model.set_PI(PI)
+            stored = self.model_store.get(species, N_HIDDEN_STATES, N_EMISSIONS)
+            self.store_base.append(EMPTY if stored is None else stored)
+            if warm:
+                self.em_iters = WARM_EM_ITERS
+
+    def store_model(self, model_id):
+        if self.model_store is not None:
+            model = self.models_fish[model_id]
+            # Online updates follow every revealed fish, retraining only the ones revealed before it
+            n_sequences = len(self.species_obs[model_id]) if self.online[model_id] is not None else self.trained[model_id]
+            self.model_store.update(model_id, model.A, model.B, model.PI, n_sequences, self.store_base[model_id])
+
+    def init_fishes(self, n_fish):
+        """
+        Allocate the per-fish state. Called again on the first step if the game
+        has a different number of fishes than N_FISH, e.g. a synthetic one.
+        """
+        # Observations of every fish and the ids of the fishes not guessed yet, shared
+        # with the training worker if it was sized for this game
+        buffer = None
+        if self.training_worker is not None and self.training_worker.observations_shape == (n_fish, self.n_steps):
+            buffer = self.training_worker.observations
+        self.observations = ObservationStore(n_fish, self.n_steps, buffer=buffer)
+        self.pending = list(range(n_fish))
+        # Cluster of every fish, from the emission histograms at the first guess, and the revealed types
+        self.clusters = None
+        self.revealed = {}
+
+        # Running forward pass of every fish against every model
+        self.forward_cache = ForwardCache(self.models_fish, self.observations, self.dtype)
+
+    def update_model(self, model_id, max_iters=EM_ITERS, deadline=None):
+        """
+        Retrain a species model on the revealed fishes of that species.
+        :return: iterations run, seconds taken and whether the model converged
+        """
+        self.em_driver.max_iters = max_iters
+        self.em_driver.deadline = deadline
+        # Restarts only help models with several hidden states, trained from a near-uniform start
+        restarts = N_RESTARTS if N_HIDDEN_STATES > 1 and not self.trained[model_id] else 1
+        A, B, PI = calculate_temp(self.models_fish[model_id].A, self.models_fish[model_id].B, self.models_fish[model_id].PI, self.species_obs[model_id], self.em_driver, restarts)
+        self.trained[model_id] = len(self.species_obs[model_id])
         self.models_fish[model_id].set_A(A)
         self.models_fish[model_id].set_B(B)
         self.models_fish[model_id].set_PI(PI)
+        self.forward_cache.invalidate(model_id)
+        self.reset_online(model_id)
+        self.store_model(model_id)
+
+        if self.profiler is not None:
+            self.profiler.count("em_iters", self.em_driver.n_iters)
+        trace = self.em_driver.trace
+        elapsed = trace[-1]["elapsed_ms"] / 1000 if trace else 0
+        return self.em_driver.n_iters, elapsed, self.em_driver.stop_reason in ("log_prob", "tol")
+
+    def load_published_models(self):
+        """
+        Swap in the models retrained by the background worker since the last step.
+        """
+        if self.profiler is not None:
+            self.profiler.count("em_iters", self.training_worker.poll_em_iters())
+        for model_id, (A, B, PI) in self.training_worker.poll().items():
+            self.models_fish[model_id].set_A(A)
+            self.models_fish[model_id].set_B(B)
+            self.models_fish[model_id].set_PI(PI)
+            self.trained[model_id] = self.submitted[model_id]
+            self.forward_cache.invalidate(model_id)
+            self.reset_online(model_id)
+            self.store_model(model_id)
+
+    def reset_online(self, model_id):
+        """
+        Restart the online statistics of a species from its batch retrained model.
+        """
+        online = self.online[model_id]
+        if online is not None:
+            model = self.models_fish[model_id]
+            online.reset(model.A, model.B, model.PI, sum(map(len, self.species_obs[model_id][:self.trained[model_id]])))
+
+    def update_online(self, observations):
+        """
+        Step the online EM of every species over the new emissions of its revealed
+        fishes. The forward cache keeps the past steps scored with the previous
+        parameters and uses the new ones from the next step on.
+        """
+        for model_id, online in enumerate(self.online):
+            if online is not None and online.filters:
+                A, B = online.step(observations)
+                self.models_fish[model_id].set_A(A)
+                self.models_fish[model_id].set_B(B)
+                self.forward_cache.reload(model_id)
 
     def guess(self, step, observations):
         """
@@ -253,23 +262,60 @@ class PlayerControllerHMM(PlayerControllerHMMAbstract):
         :return: None or a tuple (fish_id, fish_type)
         """
 
-        for i in range(len(self.fishes)):
-            self.fishes[i][1].append(observations[i])
+        self.scheduler.start_step()
+        if len(self.observations) == 0 and len(observations) != len(self.pending):
+            self.init_fishes(len(observations))
+        self.observations.append(observations)
+        self.forward_cache.update()
+        self.update_online(observations)
 
-        if step < 110:      # 110 = 180 timesteps - 70 guesses
+        if self.training_worker is not None:
+            self.load_published_models()
+        else:
+            self.scheduler.run_training(self.update_model)
+
+        if not self.scheduler.is_guess_step(step, len(self.pending)):
             return None
         else:
-            fish_id, obs = self.fishes.pop()
-            fish_type = 0
-            max = 0
-            for model, j in zip(self.models_fish, range(N_SPECIES)):
-                m = forward_algorithm(obs, model)
-                if m > max:
-                    max = m
-                    fish_type = j
-            self.obs = obs
+            if self.cluster_order and self.clusters is None:
+                self.clusters = cluster_fishes(self.forward_cache.counts, N_SPECIES)
+            fish_id = self.next_fish()
+            fish_type = self.classify(fish_id)
+            self.obs = self.observations.sequence(fish_id)
             return fish_id, fish_type
 
+    def next_fish(self):
+        """
+        Take the pending fish whose cluster has the most revealed members, as
+        the models of their species are the best trained. Without clusters,
+        the last pending fish.
+        """
+        if self.clusters is None:
+            return self.pending.pop()
+        revealed = np.bincount(self.clusters[list(self.revealed)], minlength=N_SPECIES)
+        # Ties go to the last pending fish
+        index = len(self.pending) - 1 - int(np.argmax(revealed[self.clusters[self.pending[::-1]]]))
+        return self.pending.pop(index)
+
+    def classify(self, fish_id):
+        """
+        Most likely species of a fish, with a prior from its cluster: the species
+        of its revealed cluster mates or, without any, the species not revealed
+        yet. The prior is smoothed, so it only breaks close calls between the
+        models and never rules a species out.
+        """
+        log_probs = self.forward_cache.log_prob()[fish_id]
+        if self.clusters is not None:
+            mates = np.zeros(N_SPECIES)
+            unseen = np.ones(N_SPECIES, dtype=bool)
+            for other, species in self.revealed.items():
+                unseen[species] = False
+                if self.clusters[other] == self.clusters[fish_id]:
+                    mates[species] += 1
+            counts = CLUSTER_PRIOR_COUNT + (mates if mates.any() else unseen)
+            log_probs = log_probs + np.log(counts / counts.sum())
+        return int(np.argmax(log_probs))
+
     def reveal(self, correct, fish_id, true_type):
         """
         This methods gets called whenever a guess was made.
@@ -281,5 +327,40 @@ class PlayerControllerHMM(PlayerControllerHMMAbstract):
         :return:
         """
 
+        self.species_obs[true_type].append(self.obs)
+        self.revealed[fish_id] = true_type
+        if self.online_em:
+            model = self.models_fish[true_type]
+            if self.online[true_type] is None:
+                # The model was trained on the fishes revealed before this one, if at all
+                n_observations = sum(map(len, self.species_obs[true_type][:self.trained[true_type]]))
+                self.online[true_type] = OnlineEM(model.A, model.B, model.PI, n_observations)
+            self.online[true_type].add_fish(fish_id, np.asarray(self.obs))
         if not correct:
-            self.update_model(true_type)
\ No newline at end of file
+            if self.training_worker is not None:
+                model = self.models_fish[true_type]
+                self.submitted[true_type] = len(self.species_obs[true_type])
+                if self.observations.shared:
+                    # The worker reads the sequences from the shared store
+                    fish_ids = [other for other, species in self.revealed.items() if species == true_type]
+                    lengths = [len(obs) for obs in self.species_obs[true_type]]
+                    self.training_worker.submit(true_type, model.A, model.B, model.PI, None, lengths, fish_ids)
+                else:
+                    obs, lengths = pad_sequences(self.species_obs[true_type])
+                    self.training_worker.submit(true_type, model.A, model.B, model.PI, obs, lengths)
+            else:
+                self.scheduler.schedule_training(true_type, self.em_iters)
+
+    def end_game(self):
+        """
+        Save the models learnt in this game for the next ones, including the
+        ones the training worker published since the last step.
+        """
+        if self.model_store is not None:
+            if self.training_worker is not None:
+                self.load_published_models()
+            # Every model trained in this game, with the online updates since its last retraining
+            for model_id in range(N_SPECIES):
+                if self.trained[model_id] or self.online[model_id] is not None:
+                    self.store_model(model_id)
+            self.model_store.save()
\ No newline at end of file
@@ -1,7 +1,13 @@
+from time import perf_counter
+
 from player_utils import PlayerController
+from profiler import StepProfiler
 
 
 class PlayerControllerHMMAbstract(PlayerController):
+    # StepProfiler of the player loop, if enabled in the settings
+    profiler = None
+
     def __init__(self):
         super().__init__()
         self.__name2id = dict()
@@ -14,42 +20,86 @@ class PlayerControllerHMMAbstract(PlayerController):
         receiver, with this it computes the next movement.
         :return:
         """
+        if self.settings is not None and self.settings.profile_trace:
+            self.profiler = StepProfiler(self.settings.profile_trace)
         self.init_parameters()
 
         count = 0
         n_fish = 0
         while True:
+            start = perf_counter()
             msg = self.receiver()
+            received = perf_counter()
             count += 1
 
-            if count == 1:
-                # Initialize name2id map
-                for key in msg.keys():
-                    if key.startswith('fish'):
-                        if key not in self.__name2id:
-                            id = len(self.__name2id)
-                            self.__name2id[key] = id
+            if 'observations' in msg:
+                # Binary protocol, the observations are already ordered by fish id
+                observations = msg['observations']
+            else:
+                if count == 1:
+                    # Initialize name2id map
+                    for key in msg.keys():
+                        if key.startswith('fish'):
+                            if key not in self.__name2id:
+                                id = len(self.__name2id)
+                                self.__name2id[key] = id
 
-                n_fish = len(self.__name2id)
+                    n_fish = len(self.__name2id)
 
-            observations = [0] * n_fish
-            for key in msg.keys():
-                if key in self.__name2id:
-                    observations[self.__name2id[key]] = msg[key]
+                observations = [0] * n_fish
+                for key in msg.keys():
+                    if key in self.__name2id:
+                        observations[self.__name2id[key]] = msg[key]
 
+            received_bytes = self.received_bytes
             guess_result = self.guess(count, observations)
+            guessed = perf_counter()
+            # Time spent waiting for the reveal message and handling it, on guessing steps only
+            phases = {}
             if guess_result is None:
                 msg = {'guessing': False}
                 self.sender(msg)
+                sent = perf_counter()
             elif type(guess_result) is tuple:
                 fish_id, fish_type = guess_result
                 msg = {'guessing': True, 'id': fish_id, 'type': fish_type}
                 self.sender(msg)
+                sent = perf_counter()
                 msg2 = self.receiver()
+                reveal_received = perf_counter()
                 self.reveal(msg2['correct'], msg2['id'], msg2['type'])
+                phases = {'reveal_wait': reveal_received - sent, 'reveal': perf_counter() - reveal_received}
             else:
                 raise Exception(f'Wrong return type: {type(guess_result)}')
 
+            if self.profiler is not None:
+                self.profiler.record_step(count, receive=received - start, guess=guessed - received,
+                                          send=sent - guessed, received_bytes=received_bytes,
+                                          sent_bytes=self.sent_bytes, **phases)
+
+    def on_game_over(self):
+        """
+        Called by the receiver when the game_over message arrives, right before
+        it exits the process, so player_loop never sees that message. This is
+        where the player saves its models at the end of a GUI game.
+        """
+        self.end_game()
+        if self.profiler is not None:
+            self.profiler.dump()
+
+    def init_workers(self):
+        """
+        Called in the game process before the player process is started, to
+        launch any helper process the player needs.
+        """
+        pass
+
+    def end_game(self):
+        """
+        Called once the game is over, to save anything the player wants to keep.
+        """
+        pass
+
     def init_parameters(self):
         raise NotImplementedError()
 
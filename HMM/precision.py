@@ -0,0 +1,99 @@
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+
+from baum_welch_numpy import pad_sequences
+from em_driver import EMDriver
+from observation_store import ObservationStore
+from scoring import ForwardCache
+from sequences import Sequences
+
+DTYPES = {
+    "float64": np.float64,
+    "float32": np.float32,
+}
+
+
+def check_precision(A, B, pi, obs, lengths, M=None, dtype=np.float32, iterations=1, tol=1e-3):
+    """
+    Train the same model in double precision and in dtype, and compare them.
+    The EM recursions are scaled at every step, so single precision only
+    loses relative accuracy, which this check bounds. Over many iterations
+    from a near-uniform start the two may drift to different optima, so the
+    comparison is meant for a few iterations.
+    :param obs: padded observations (S x T)
+    :param lengths: number of valid steps of every sequence (S)
+    :param tol: largest accepted difference of the parameters, and of the log
+                probability relative to its magnitude
+    :return: dictionary with the differences and whether they are within tol
+    """
+    fits = []
+    for fit_dtype in (np.float64, dtype):
+        driver = EMDriver(max_iters=iterations, dtype=fit_dtype)
+        fits.append((driver.fit(A, B, pi, obs, lengths, M), driver.log_prob))
+
+    (params, log_prob), (compact_params, compact_log_prob) = fits
+    report = {
+        "max_param_diff": float(max(np.abs(x - y.astype(np.float64)).max() for x, y in zip(params, compact_params))),
+        "log_prob_rel_diff": float(abs(log_prob - compact_log_prob) / max(abs(log_prob), 1)),
+    }
+    report["ok"] = report["max_param_diff"] <= tol and report["log_prob_rel_diff"] <= tol
+    return report
+
+
+def check_scoring_precision(models, store, dtype=np.float32, tol=1e-3):
+    """
+    Score the observations of a store with every model in double precision and in dtype.
+    :return: dictionary with the largest relative log-likelihood difference and whether it is within tol
+    """
+    log_probs = []
+    for cache_dtype in (np.float64, dtype):
+        cache = ForwardCache(models, store, cache_dtype)
+        cache.update()
+        log_probs.append(cache.log_prob())
+
+    diff = np.abs(log_probs[0] - log_probs[1]) / np.maximum(np.abs(log_probs[0]), 1)
+    report = {"log_prob_rel_diff": float(diff.max()) if diff.size else 0.0}
+    report["ok"] = report["log_prob_rel_diff"] <= tol
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare float32 training and scoring with float64")
+    parser.add_argument("sequences", nargs="?", default="sequences.json", help="JSON or binary sequences file")
+    parser.add_argument("--n-states", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--tol", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    data = Sequences().load_file(args.sequences).data
+    observations = np.asarray(data["sequences"], dtype=np.uint8)
+    fish_types = np.asarray(data["fish_types"])
+    M = int(observations.max()) + 1
+    rng = np.random.default_rng(0)
+
+    ok = True
+    models = []
+    for species in np.unique(fish_types):
+        model = SimpleNamespace(A=rng.dirichlet(np.ones(args.n_states), size=args.n_states),
+                                B=rng.dirichlet(np.ones(M), size=args.n_states),
+                                PI=rng.dirichlet(np.ones(args.n_states)))
+        models.append(model)
+        obs, lengths = pad_sequences(observations[fish_types == species])
+        report = check_precision(model.A, model.B, model.PI, obs, lengths, M, iterations=args.iterations,
+                                 tol=args.tol)
+        print("Training species", species, report)
+        ok &= report["ok"]
+
+    store = ObservationStore(*observations.shape)
+    for step in observations.T:
+        store.append(step)
+    report = check_scoring_precision(models, store, tol=args.tol)
+    print("Scoring", report)
+    ok &= report["ok"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
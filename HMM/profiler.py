@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+class StepProfiler:
+    """
+    Records where the time of every step of the player loop goes: waiting for
+    the observations, guessing, sending the answer, waiting for the reveal and
+    handling it, together with message sizes and counters reported by the
+    player, such as EM iterations. The trace is written as JSON at the end of the game.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: JSON file the trace is written to
+        """
+        self.path = path
+        self.steps = []
+        # Counters reported since the last recorded step
+        self.counters = {}
+        self.counter_names = set()
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        self.counter_names.add(name)
+
+    def record_step(self, step, **values):
+        """
+        :param step: step number
+        :param values: durations in seconds, named after the phase, and message sizes in bytes
+        """
+        record = {"step": step}
+        for name, value in values.items():
+            if name.endswith("_bytes"):
+                record[name] = value
+            else:
+                record[name + "_ms"] = 1000 * value
+        record.update(self.counters)
+        self.counters = {}
+        self.steps.append(record)
+
+    def summary(self):
+        """
+        :return: percentiles and maximum of every column over the steps that recorded
+                 it, e.g. the reveal columns over the guessing steps only. Counters
+                 count as zero on the steps that did not report them.
+        """
+        columns = {}
+        for record in self.steps:
+            for name, value in record.items():
+                if name != "step":
+                    columns.setdefault(name, []).append(value)
+
+        summary = {}
+        for name, values in columns.items():
+            if name in self.counter_names:
+                values = values + [0] * (len(self.steps) - len(values))
+            values = np.asarray(values, dtype=float)
+            summary[name] = {f"p{q}": float(np.percentile(values, q)) for q in PERCENTILES}
+            summary[name]["max"] = float(values.max())
+        return summary
+
+    def format_summary(self, summary=None):
+        if summary is None:
+            summary = self.summary()
+        lines = [f"Steps: {len(self.steps)}"]
+        for name, stats in summary.items():
+            lines.append(name + "\t" + "\t".join(f"{key}: {round(value, 3)}" for key, value in stats.items()))
+        return "\n".join(lines)
+
+    def dump(self):
+        """
+        Write the trace and print its summary.
+        """
+        summary = self.summary()
+        with open(self.path, "w") as f:
+            json.dump({"summary": summary, "steps": self.steps}, f, indent=1)
+        print(self.format_summary(summary))
@@ -0,0 +1,68 @@
+from time import time
+
+
+class GuessScheduler:
+    """
+    Keeps track of the time left in the current step and spreads model
+    retraining over the steps, so that no single step gets close to the
+    game's time threshold.
+    """
+
+    def __init__(self, time_threshold, n_steps, safety=0.5):
+        """
+        :param time_threshold: seconds the game waits for an answer
+        :param n_steps: total number of steps of the game
+        :param safety: fraction of time_threshold the player allows itself per step
+        """
+        self.budget = time_threshold * safety
+        self.n_steps = n_steps
+        self.step_start = time()
+        # Seconds per EM iteration, as a moving average over the trainings so far
+        self.iter_cost = 0
+        # Pending retraining jobs as [model_id, iterations left]
+        self.jobs = []
+
+    def start_step(self):
+        self.step_start = time()
+
+    def deadline(self):
+        return self.step_start + self.budget
+
+    def remaining(self):
+        return self.deadline() - time()
+
+    def is_guess_step(self, step, n_pending):
+        """
+        Guess only once every remaining step is needed for a pending fish,
+        and use the steps before that to observe and train.
+        """
+        return self.n_steps - step <= n_pending
+
+    def schedule_training(self, model_id, iterations):
+        for job in self.jobs:
+            if job[0] == model_id:
+                job[1] = max(job[1], iterations)
+                return
+        self.jobs.append([model_id, iterations])
+
+    def run_training(self, train):
+        """
+        Run as many pending EM iterations as fit in what is left of the step.
+        :param train: callable(model_id, max_iters, deadline) returning the number
+                      of iterations it ran, the seconds they took and whether
+                      the model converged
+        """
+        while self.jobs and self.remaining() > self.iter_cost:
+            model_id, iterations = self.jobs.pop(0)
+            max_iters = iterations
+            if self.iter_cost > 0:
+                max_iters = min(iterations, max(1, int(self.remaining() / self.iter_cost)))
+            n_iters, elapsed, converged = train(model_id, max_iters, self.deadline())
+
+            if n_iters > 0:
+                cost = elapsed / n_iters
+                self.iter_cost = cost if self.iter_cost == 0 else 0.8 * self.iter_cost + 0.2 * cost
+            if not converged and n_iters < iterations:
+                # Out of time for this step, resume the job in the next one
+                self.jobs.insert(0, [model_id, iterations - n_iters])
+                break
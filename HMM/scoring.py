@@ -0,0 +1,102 @@
+import sys
+
+import numpy as np
+
+tiny = sys.float_info.min
+
+
+class ForwardCache:
+    """
+    Online forward pass of every fish against every model. Keeps the last
+    normalized alpha and the accumulated log-scale of each (fish, model) pair,
+    so every new observation costs a single N x N update, with the products
+    of A and the emission probabilities of every symbol precomputed per model.
+    Single-state models are scored from running emission histograms instead,
+    which makes re-estimating them O(M) per fish.
+    """
+
+    def __init__(self, models, store, dtype=np.float64):
+        """
+        :param models: list of S objects with A, B and PI attributes
+        :param store: ObservationStore with the observations of every fish
+        :param dtype: precision of the alphas and operators, the log-likelihoods are always doubles
+        """
+        self.models = models
+        self.store = store
+        self.dtype = dtype
+        # Number of steps of the store already processed
+        self.t = 0
+        n_fish = store.data.shape[0]
+        self.log_probs = np.zeros((n_fish, len(models)))
+        self.counts = np.zeros((n_fish, max(len(model.B[0]) for model in models)))
+        self.params = [None] * len(models)
+        self.alphas = [None] * len(models)
+        for model_id in range(len(models)):
+            self.invalidate(model_id)
+
+    def _step(self, model_id, observations):
+        operators, B_T, pi = self.params[model_id]
+        alpha = self.alphas[model_id]
+        if alpha is None:
+            alpha = pi * B_T[observations]
+        else:
+            # alpha_t+1 = alpha_t A diag(B[:, o]), as one precomputed operator per symbol
+            alpha = np.einsum('fi,fij->fj', alpha, operators[observations])
+        c = np.maximum(alpha.sum(axis=1), np.finfo(alpha.dtype).tiny)
+        self.log_probs[:, model_id] += np.log(c)
+        self.alphas[model_id] = alpha / c[:, None]
+
+    def update(self):
+        """
+        Advance every (fish, model) pair over the observations appended to the
+        store since the last call.
+        """
+        fishes = np.arange(len(self.counts))
+        for observations in self.store.window(self.t).T:
+            self.counts[fishes, observations] += 1
+            for model_id in range(len(self.models)):
+                if len(self.params[model_id]) == 3:
+                    self._step(model_id, observations)
+        self.t = len(self.store)
+
+    def invalidate(self, model_id):
+        """
+        Reload the parameters of a re-estimated model and replay the
+        observations processed so far through it.
+        :param model_id: index of the model in models
+        """
+        if not self.reload(model_id):
+            return
+        self.alphas[model_id] = None
+        self.log_probs[:, model_id] = 0
+        for observations in self.store.window(0, self.t).T:
+            self._step(model_id, observations)
+
+    def reload(self, model_id):
+        """
+        Reload the parameters of a model for the observations to come only,
+        without replaying the past ones. Exact for single-state models, whose
+        scores always use the current parameters.
+        :param model_id: index of the model in models
+        :return: whether the model needs a forward pass, i.e. has several states
+        """
+        model = self.models[model_id]
+        A = np.asarray(model.A, dtype=float)
+        B_T = np.asarray(model.B, dtype=float).T.copy()
+        if len(A) == 1:
+            self.params[model_id] = (np.log(np.maximum(B_T[:, 0], tiny)),)
+            return False
+
+        self.params[model_id] = ((A[None] * B_T[:, None, :]).astype(self.dtype), B_T.astype(self.dtype),
+                                 np.asarray(model.PI, dtype=self.dtype).ravel())
+        return True
+
+    def log_prob(self):
+        """
+        :return: log-likelihoods of the observations so far (n_fish x S)
+        """
+        log_probs = self.log_probs.copy()
+        for model_id, params in enumerate(self.params):
+            if len(params) == 1:
+                log_probs[:, model_id] = self.counts[:, :len(params[0])] @ params[0]
+        return log_probs
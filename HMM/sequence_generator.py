@@ -0,0 +1,121 @@
+import argparse
+
+import numpy as np
+
+import constants
+from datafile import ModelsDatafile
+from sequences import Sequences
+
+
+class SequenceGenerator:
+    """
+    Samples one HMM per species and fish observation sequences from them, in
+    the format of sequences.json. Can be passed to Sequences as its generator,
+    e.g. Sequences(functools.partial(SequenceGenerator, n_fish=700)).
+    """
+
+    def __init__(self, n_fish=constants.N_FISH, n_steps=constants.N_STEPS, n_species=constants.N_SPECIES,
+                 n_states=3, n_emissions=constants.N_EMISSIONS, concentration=0.5, seed=None):
+        """
+        :param n_states: number of hidden states of every species model
+        :param concentration: Dirichlet concentration of the sampled rows,
+                              smaller values give more distinct species
+        :param seed: seed of the random generator
+        """
+        self.n_fish = n_fish
+        self.n_steps = n_steps
+        self.n_species = n_species
+        self.n_states = n_states
+        self.n_emissions = n_emissions
+        self.concentration = concentration
+        self.rng = np.random.default_rng(seed)
+        self.models = None
+        self.data = None
+
+    def sample_models(self):
+        """
+        :return: list with a dictionary of A, B and pi per species
+        """
+        def rows(n_rows, n_cols):
+            return self.rng.dirichlet([self.concentration] * n_cols, size=n_rows)
+
+        return [{"A": rows(self.n_states, self.n_states),
+                 "B": rows(self.n_states, self.n_emissions),
+                 "pi": rows(1, self.n_states)[0]} for _ in range(self.n_species)]
+
+    def load_models(self, models):
+        """
+        Use the given species models and sample the sequences again from them.
+        :param models: list with a dictionary of A, B and pi per species
+        """
+        self.models = [{key: np.asarray(value, dtype=float) for key, value in model.items()} for model in models]
+        if self.data is not None:
+            self.load_data(self.data)
+
+    def sample_sequences(self, fish_types):
+        """
+        Sample the observations of every fish, vectorized over the fishes.
+        :return: observations (n_fish x n_steps)
+        """
+        cum_A = np.cumsum([model["A"] for model in self.models], axis=2)
+        cum_B = np.cumsum([model["B"] for model in self.models], axis=2)
+        cum_pi = np.cumsum([model["pi"] for model in self.models], axis=1)
+
+        def sample(cum_probs):
+            u = self.rng.random(len(cum_probs))
+            return np.minimum((cum_probs < u[:, None]).sum(axis=1), cum_probs.shape[1] - 1)
+
+        observations = np.empty((len(fish_types), self.n_steps), dtype=np.uint8)
+        states = sample(cum_pi[fish_types])
+        for t in range(self.n_steps):
+            observations[:, t] = sample(cum_B[fish_types, states])
+            states = sample(cum_A[fish_types, states])
+        return observations
+
+    def load_data(self, data):
+        """
+        Fill a sequences dictionary with freshly sampled fishes.
+        :param data: dictionary to fill
+        """
+        self.data = data
+        if self.models is None:
+            self.models = self.sample_models()
+
+        fish_types = self.rng.integers(self.n_species, size=self.n_fish)
+        init_pos = np.round(self.rng.integers(0, 21, size=(self.n_fish, 2)) * 0.05, 2)
+
+        data["n_fish"] = self.n_fish
+        data["fish_types"] = fish_types.tolist()
+        data["n_seq"] = self.n_steps
+        data["init_pos"] = init_pos.tolist()
+        data["sequences"] = self.sample_sequences(fish_types).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic sequences file")
+    parser.add_argument("output", help="sequences file to write")
+    parser.add_argument("--n-fish", type=int, default=constants.N_FISH)
+    parser.add_argument("--n-steps", type=int, default=constants.N_STEPS)
+    parser.add_argument("--n-species", type=int, default=constants.N_SPECIES)
+    parser.add_argument("--n-states", type=int, default=3)
+    parser.add_argument("--n-emissions", type=int, default=constants.N_EMISSIONS)
+    parser.add_argument("--concentration", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--binary", action="store_true", help="write a binary sequences file")
+    parser.add_argument("--models", help="also write the sampled species models to this file")
+    args = parser.parse_args()
+
+    generator = SequenceGenerator(args.n_fish, args.n_steps, args.n_species, args.n_states,
+                                  args.n_emissions, args.concentration, args.seed)
+    sequences = Sequences()
+    generator.load_data(sequences.data)
+    sequences.save(args.output, binary=args.binary)
+
+    if args.models is not None:
+        models = ModelsDatafile()
+        models.data = generator.models
+        models.save(args.models)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,18 @@ class Sequences:
         self.data = datafile.data
         return self
 
-    def save(self, filename):
+    def load_file(self, filename):
+        """
+        Load a JSON or binary sequences file. The sequences of a binary file
+        are memory-mapped rather than read.
+        """
+        self.data = SequencesDatafile().load_file(filename).data
+        return self
+
+    def save(self, filename, binary=False):
         datafile = SequencesDatafile()
         datafile.data = self.data
-        datafile.save(filename)
+        if binary:
+            datafile.save_binary(filename)
+        else:
+            datafile.save(filename)
@@ -0,0 +1,137 @@
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import sys
+
+import numpy as np
+
+import constants
+from datafile import BINARY_SUFFIX
+from headless import HeadlessGame, load_player_class
+from sequence_generator import SequenceGenerator
+from sequences import Sequences
+
+PERCENTILES = (50, 90, 99)
+
+
+def sequence_files(paths):
+    """
+    :param paths: sequence files and directories containing them
+    :return: sorted list of the JSON and binary files
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in os.listdir(path) if name.endswith((".json", BINARY_SUFFIX))]
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def latency_summary(step_times):
+    """
+    :return: percentiles and maximum of the step times, in milliseconds
+    """
+    step_ms = 1000 * np.asarray(step_times)
+    if len(step_ms) == 0:
+        step_ms = np.zeros(1)
+    summary = {f"p{q}_ms": float(np.percentile(step_ms, q)) for q in PERCENTILES}
+    summary["max_ms"] = float(step_ms.max())
+    return summary
+
+
+def play(job):
+    """
+    Play one game in the current process.
+    :param job: (sequences file, player class name, time threshold, repetition),
+                with "seed:<n>" as file for a synthetic game of that seed
+    :return: report row of the game
+    """
+    path, player_name, time_threshold, repetition = job
+    if path.startswith("seed:"):
+        data = {}
+        SequenceGenerator(seed=int(path[len("seed:"):])).load_data(data)
+    else:
+        data = Sequences().load_file(path).data
+
+    result = HeadlessGame(data, time_threshold).run(load_player_class(player_name)())
+
+    row = {
+        "file": path,
+        "repetition": repetition,
+        "score": result["score"],
+        "n_fish": result["n_fish"],
+        "accuracy": result["score"] / result["n_fish"],
+        "steps": result["steps"],
+        "timeout": result["timeout"],
+    }
+    row.update(latency_summary(result["step_times"]))
+    # Kept for the overall percentiles, dropped from the report
+    row["step_times"] = result["step_times"]
+    return row
+
+
+def run_tournament(files, player_name, processes=None, repeat=1, time_threshold=constants.STEP_TIME_THRESHOLD):
+    """
+    Play every sequences file repeat times over a process pool.
+    :return: report with one row per game and the aggregated results
+    """
+    jobs = [(path, player_name, time_threshold, r) for path in files for r in range(repeat)]
+    with mp.Pool(processes) as pool:
+        games = pool.map(play, jobs)
+
+    step_times = [t for game in games for t in game.pop("step_times")]
+    summary = {
+        "player": player_name,
+        "games": len(games),
+        "mean_accuracy": float(np.mean([game["accuracy"] for game in games])) if games else 0.0,
+        "timeouts": sum(game["timeout"] for game in games),
+    }
+    summary.update(latency_summary(step_times))
+    return {"summary": summary, "games": games}
+
+
+def write_report(report, output, fmt):
+    if fmt == "json":
+        json.dump(report, output, indent=2)
+        output.write("\n")
+    else:
+        writer = csv.DictWriter(output, fieldnames=list(report["games"][0].keys()))
+        writer.writeheader()
+        writer.writerows(report["games"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless HMM games in parallel")
+    parser.add_argument("paths", nargs="*", help="sequence files or directories of sequence files")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="also play this many synthetic games, seeded 0, 1, ...")
+    parser.add_argument("--player", default="player:PlayerControllerHMM", help="player class as module:Class")
+    parser.add_argument("--processes", type=int, default=None, help="size of the process pool")
+    parser.add_argument("--repeat", type=int, default=1, help="games per sequences file")
+    parser.add_argument("--time-threshold", type=float, default=constants.STEP_TIME_THRESHOLD)
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--output", help="report file, stdout if not given")
+    args = parser.parse_args()
+
+    files = sequence_files(args.paths) + [f"seed:{seed}" for seed in range(args.synthetic)]
+    if not files:
+        parser.error("no sequence files found")
+    report = run_tournament(files, args.player, args.processes, args.repeat, args.time_threshold)
+
+    if args.output is None:
+        write_report(report, sys.stdout, args.format)
+    else:
+        with open(args.output, "w", newline="") as f:
+            write_report(report, f, args.format)
+
+    summary = report["summary"]
+    print("Games:", summary["games"], "\tMean accuracy:", round(summary["mean_accuracy"], 4),
+          "\tTimeouts:", summary["timeouts"], "\tp99 step:", round(summary["p99_ms"], 2), "ms",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
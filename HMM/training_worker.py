@@ -0,0 +1,151 @@
+import multiprocessing as mp
+import os
+import queue
+
+import numpy as np
+
+from em_driver import EMDriver
+
+
+class TrainingWorker:
+    """
+    Retrains species models in a separate process. Jobs are sent over a queue
+    and the trained A, B and pi of every model are published in shared memory
+    together with a version counter, so the player can always read the latest
+    models without waiting. The observations of the fishes can be shared the
+    same way, by keeping the player's ObservationStore in observations, so
+    jobs only name the fishes to train on.
+    """
+
+    def __init__(self, n_models, n_states, n_emissions, n_fish=0, n_steps=0, max_iters=50, tol=1e-4,
+                 dtype=np.float64):
+        """
+        :param n_fish: number of fishes of the shared observations
+        :param n_steps: number of steps of the shared observations
+        :param dtype: precision of the EM workspaces, the published models are doubles
+        """
+        self.n_models = n_models
+        self.n_states = n_states
+        self.n_emissions = n_emissions
+        self.max_iters = max_iters
+        self.tol = tol
+        self.dtype = dtype
+
+        self.model_size = n_states * n_states + n_states * n_emissions + n_states
+        self.shared_models = mp.Array('d', n_models * self.model_size)
+        self.versions = mp.Array('l', n_models)
+        # EM iterations run by the worker, and the count read by the player
+        self.em_iters = mp.Value('l', 0)
+        self.seen_em_iters = 0
+        # Observations written by the player and read by the worker, see ObservationStore
+        self.observations = mp.RawArray('B', n_fish * n_steps)
+        self.observations_shape = (n_fish, n_steps)
+        self.jobs = mp.Queue()
+        self.process = None
+        # Last version of every model read by the player
+        self.seen_versions = [0] * n_models
+
+    def __getstate__(self):
+        # The process handle stays in the process that started the worker
+        state = self.__dict__.copy()
+        state['process'] = None
+        return state
+
+    def start(self):
+        """
+        Start the worker process. It must be called from a non daemonic process.
+        """
+        self.process = mp.Process(target=self.worker_loop, args=(os.getpid(),), daemon=True)
+        self.process.start()
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def submit(self, model_id, A, B, pi, obs, lengths, fish_ids=None):
+        """
+        Queue a retraining job, returns immediately.
+        :param obs: padded observations (S x T), None to read them from the shared observations
+        :param lengths: number of valid steps of every sequence (S)
+        :param fish_ids: fishes of the sequences in the shared observations (S), if obs is None
+        """
+        # Never block the player at exit on jobs the worker will not read
+        self.jobs.cancel_join_thread()
+        if obs is not None:
+            obs = np.asarray(obs)
+        self.jobs.put((model_id, np.asarray(A, dtype=float), np.asarray(B, dtype=float),
+                       np.asarray(pi, dtype=float).ravel(), obs, np.asarray(lengths), fish_ids))
+
+    def shared_observations(self):
+        """
+        :return: view on the shared observations (n_fish x n_steps)
+        """
+        return np.frombuffer(self.observations, dtype=np.uint8).reshape(self.observations_shape)
+
+    def model_views(self, model_id):
+        """
+        :return: A, B and pi of a model as views on the shared memory
+        """
+        N, M = self.n_states, self.n_emissions
+        flat = np.frombuffer(self.shared_models.get_obj())
+        flat = flat[model_id * self.model_size:(model_id + 1) * self.model_size]
+        return (flat[:N * N].reshape(N, N),
+                flat[N * N:N * N + N * M].reshape(N, M),
+                flat[N * N + N * M:])
+
+    def poll(self):
+        """
+        Read the models published since the last call.
+        :return: dictionary from model id to a copy of its (A, B, pi)
+        """
+        updated = {}
+        with self.shared_models.get_lock():
+            for model_id in range(self.n_models):
+                if self.versions[model_id] != self.seen_versions[model_id]:
+                    self.seen_versions[model_id] = self.versions[model_id]
+                    updated[model_id] = tuple(view.copy() for view in self.model_views(model_id))
+        return updated
+
+    def poll_em_iters(self):
+        """
+        :return: number of EM iterations the worker ran since the last call
+        """
+        total = self.em_iters.value
+        new, self.seen_em_iters = total - self.seen_em_iters, total
+        return new
+
+    def worker_loop(self, parent_pid):
+        driver = EMDriver(max_iters=self.max_iters, tol=self.tol, dtype=self.dtype)
+        while True:
+            try:
+                job = self.jobs.get(timeout=1)
+            except queue.Empty:
+                # Stop when the process that started the worker is gone
+                if os.getppid() != parent_pid:
+                    return
+                continue
+
+            # Only the latest job of every model is worth training
+            latest = {}
+            while job is not None:
+                latest[job[0]] = job
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+            stop = job is None
+
+            for model_id, A, B, pi, obs, lengths, fish_ids in latest.values():
+                if obs is None:
+                    # The steps before every length are written and no longer change
+                    obs = self.shared_observations()[fish_ids, :lengths.max()]
+                A, B, pi = driver.fit(A, B, pi, obs, lengths, self.n_emissions)
+
+                with self.shared_models.get_lock():
+                    view_A, view_B, view_pi = self.model_views(model_id)
+                    view_A[:], view_B[:], view_pi[:] = A, B, pi
+                    self.versions[model_id] += 1
+                with self.em_iters.get_lock():
+                    self.em_iters.value += driver.n_iters
+
+            if stop:
+                return
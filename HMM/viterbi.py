@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def viterbi(A, B, pi, obs):
+    """
+    Iterative Viterbi decoding in the log domain.
+    :param A: transition matrix (N x N)
+    :param B: emission matrix (N x M)
+    :param pi: initial state distribution (N)
+    :param obs: observation sequence (T)
+    :return: most likely state sequence (T), as an int array
+    """
+    obs = np.asarray(obs, dtype=np.intp)
+    T = len(obs)
+    with np.errstate(divide='ignore'):
+        log_A = np.log(np.asarray(A, dtype=float))
+        log_B_T = np.log(np.asarray(B, dtype=float)).T
+        log_pi = np.log(np.asarray(pi, dtype=float).ravel())
+
+    N = log_A.shape[0]
+    states = np.empty(T, dtype=np.int32)
+    if T == 0:
+        return states
+
+    # delta_idx[t, j] is the most likely previous state of state j at time t
+    delta_idx = np.zeros((T, N), dtype=np.int32)
+    delta = log_pi + log_B_T[obs[0]]
+    cols = np.arange(N)
+    for t in range(1, T):
+        # implementing max_j∈[1,..N] a_j,i * δt−1(j) * b_i(ot), with logs
+        probabilities = delta[:, None] + log_A
+        delta_idx[t] = probabilities.argmax(axis=0)
+        delta = probabilities[delta_idx[t], cols] + log_B_T[obs[t]]
+
+    # backtrack
+    states[T - 1] = delta.argmax()
+    for t in range(T - 1, 0, -1):
+        states[t - 1] = delta_idx[t, states[t]]
+    return states
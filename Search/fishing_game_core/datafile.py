@@ -1,14 +1,94 @@
+import argparse
 import json
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+# Binary datafiles are a JSON header followed by a raw uint8 block with the
+# observations of every fish, one row per fish, which is memory-mapped on load
+BINARY_MAGIC = b"FISHOBS1"
+BINARY_PREFIX = struct.Struct('<8sI')
+BINARY_ALIGNMENT = 16
+
+
+class FishSequences(Mapping):
+    """
+    Read-only {"0": sequence, "1": ...} mapping over the rows of an
+    observations block, as the 'sequence' entry of the JSON files.
+    """
+
+    def __init__(self, observations):
+        self.observations = observations
+
+    def __getitem__(self, key):
+        fish = int(key)
+        if not 0 <= fish < len(self.observations) or str(fish) != key:
+            raise KeyError(key)
+        return self.observations[fish]
+
+    def __iter__(self):
+        return (str(fish) for fish in range(len(self.observations)))
+
+    def __len__(self):
+        return len(self.observations)
 
 
 class Datafile:
+    # Key of the observations block when stored in binary
+    observations_key = None
+
     def __init__(self, ):
         self.data = None
         self.models = None
 
     def load(self, filename):
-        with open(filename, 'r') as f:
-            self.data = json.load(f)
+        if is_binary(filename):
+            self.load_binary(filename)
+        else:
+            with open(filename, 'r') as f:
+                self.data = json.load(f)
+
+    def load_binary(self, filename):
+        """
+        Load a binary datafile. The observations are a read-only memory map,
+        so the sequence of a fish is only read from disk when it is used.
+        """
+        with open(filename, 'rb') as f:
+            magic, header_size = BINARY_PREFIX.unpack(f.read(BINARY_PREFIX.size))
+            if magic != BINARY_MAGIC:
+                raise ValueError(f"{filename} is not a binary datafile")
+            header = json.loads(f.read(header_size).decode())
+
+        block = header.pop("block")
+        offset = _aligned(BINARY_PREFIX.size + header_size)
+        if block["shape"][0] * block["shape"][1] == 0:
+            # Empty files cannot be memory-mapped
+            observations = np.zeros(block["shape"], dtype=np.uint8)
+        else:
+            observations = np.memmap(filename, dtype=np.uint8, mode='r', offset=offset, shape=tuple(block["shape"]))
+        header[block["key"]] = FishSequences(observations)
+        self.data = header
+
+    def save_binary(self, filename):
+        """
+        Save the data as a binary datafile, with the observations block as raw
+        uint8 values.
+        """
+        sequences = self.data[self.observations_key]
+        observations = np.asarray([sequences[str(fish)] for fish in range(len(sequences))])
+        if observations.ndim != 2 or (observations.size and (observations.min() < 0 or observations.max() > 255)):
+            raise ValueError("observations must be sequences of equal length with values in 0..255")
+
+        header = {key: value for key, value in self.data.items() if key != self.observations_key}
+        header["block"] = {"key": self.observations_key, "shape": list(observations.shape)}
+        header = json.dumps(header).encode()
+
+        with open(filename, 'wb') as f:
+            f.write(BINARY_PREFIX.pack(BINARY_MAGIC, len(header)))
+            f.write(header)
+            f.write(b"\0" * (_aligned(BINARY_PREFIX.size + len(header)) - BINARY_PREFIX.size - len(header)))
+            f.write(np.ascontiguousarray(observations, dtype=np.uint8).tobytes())
 
 
 class ModelsDatafile(Datafile):
@@ -16,4 +96,41 @@ class ModelsDatafile(Datafile):
 
 
 class SequencesDatafile(Datafile):
-    pass
+    observations_key = "sequence"
+
+
+def _aligned(size):
+    return -(-size // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
+
+
+def is_binary(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def convert(source, destination):
+    """
+    Convert an observations file from JSON to binary, or from binary to JSON.
+    """
+    datafile = SequencesDatafile()
+    datafile.load(source)
+    if is_binary(source):
+        data = dict(datafile.data)
+        data[datafile.observations_key] = {key: sequence.tolist()
+                                           for key, sequence in data[datafile.observations_key].items()}
+        with open(destination, 'w') as f:
+            json.dump(data, f)
+    else:
+        datafile.save_binary(destination)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an observations file between the JSON and binary formats")
+    parser.add_argument("source", help="JSON or binary observations file")
+    parser.add_argument("destination", help="converted file, binary if the source is JSON and vice versa")
+    args = parser.parse_args()
+    convert(args.source, args.destination)
+
+
+if __name__ == "__main__":
+    main()